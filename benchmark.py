@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Benchmarks sin red
+Mide el rendimiento (elementos/s) y la memoria pico (tracemalloc) de los
+parsers, puntuadores y renderizadores con datos sintéticos de varios tamaños
+o con respuestas grabadas de las APIs.
+
+Uso:
+    python benchmark.py [--sizes 10,1000,100000] [--repeat 3]
+                        [--payload-dir grabaciones/]
+                        [--baseline benchmark_baseline.json] [--save-baseline]
+                        [--threshold 0.25]
+
+Con --save-baseline se guardan los resultados como referencia; sin él, si existe
+el archivo de referencia, se compara y se sale con código 1 cuando algún caso es
+más lento o usa más memoria que la referencia en más de `threshold`.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+DEFAULT_SIZES = '10,1000,100000'
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+# Los correos de más elementos no son realistas y solo medirían la concatenación de cadenas
+RENDER_MAX_ITEMS = 10000
+
+TITLE_WORDS = [
+    'Dark', 'Souls', 'Legend', 'Quest', 'Far', 'Cry', 'Witcher', 'Indie', 'Racing', 'Puzzle',
+    'Ultimate', 'Edition', 'Deluxe', 'Shadow', 'Kingdom', 'Battle', 'Royale', 'Survival', 'Star', 'Tales'
+]
+
+# ---------------------------------------------------------------------------
+# Datos sintéticos
+# ---------------------------------------------------------------------------
+
+def _title(rng: random.Random) -> str:
+    return ' '.join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(1, 5)))
+
+def make_epic_payload(size: int, rng: random.Random) -> Dict:
+    """Feed de promociones con `size` elementos; solo los últimos 4 son gratuitos"""
+    elements = []
+    for i in range(size):
+        free = i >= size - 4
+        elements.append({
+            'title': _title(rng),
+            'id': f'offer-{i}',
+            'namespace': f'ns-{i}',
+            'description': 'Descripción ' * rng.randint(1, 20),
+            'effectiveDate': '2026-10-01T15:00:00.000Z',
+            'keyImages': [
+                {'type': 'OfferImageTall', 'url': f'https://cdn.example/{i}/tall.jpg'},
+                {'type': 'Thumbnail', 'url': f'https://cdn.example/{i}/thumb.jpg'}
+            ],
+            'price': {'totalPrice': {'discountPrice': 0 if free else 1999, 'originalPrice': 1999}},
+            'promotions': {
+                'promotionalOffers': [{
+                    'promotionalOffers': [{
+                        'startDate': '2026-10-01T15:00:00.000Z',
+                        'endDate': '2026-10-08T15:00:00.000Z',
+                        'discountSetting': {'discountType': 'PERCENTAGE', 'discountPercentage': 0 if free else 50}
+                    }]
+                }],
+                'upcomingPromotionalOffers': []
+            }
+        })
+    return {'data': {'Catalog': {'searchStore': {'elements': elements, 'paging': {'total': size}}}}}
+
+def make_bundles(size: int, rng: random.Random) -> List[Dict]:
+    """`size` bundles de GG.deals con tiers de precios variados y juegos repetidos entre bundles"""
+    bundles = []
+    for i in range(size):
+        tiers = []
+        for _ in range(rng.randint(1, 3)):
+            games = [{'title': _title(rng), 'url': f'https://gg.deals/game/{rng.randint(0, size * 2)}/'}
+                     for _ in range(rng.randint(1, 6))]
+            tiers.append({
+                'price': f'{rng.choice([1, 2, 5, 9.99, 15, 30]):.2f}',
+                'currency': 'USD',
+                'gamesCount': None,
+                'games': games
+            })
+        bundles.append({
+            'title': f'Bundle {i}',
+            'url': f'https://gg.deals/bundle/{i}/',
+            'dateTo': '2026-11-01 00:00:00',
+            'tiers': tiers
+        })
+    return bundles
+
+def make_deals(size: int, rng: random.Random) -> List[Dict]:
+    """`size` ofertas ya filtradas, como las que devuelve _filter_high_discount_games"""
+    deals = []
+    for i in range(size):
+        price_per_game = rng.choice([0.5, 1.5, 3, 7, 12])
+        deals.append({
+            'title': _title(rng),
+            'url': f'https://gg.deals/game/{i}/',
+            'bundle_title': f'Bundle {i}',
+            'bundle_url': f'https://gg.deals/bundle/{i}/',
+            'price': price_per_game * 3,
+            'currency': 'USD',
+            'price_per_game': price_per_game,
+            'estimated_discount': rng.choice([80.0, 85.0, 90.0, 95.0]),
+            'games_in_tier': 3,
+            'end_date': '2026-11-01 00:00:00',
+            'alternatives': []
+        })
+    return deals
+
+def make_epic_games(size: int, rng: random.Random) -> List[Dict]:
+    """`size` juegos de Epic ya extraídos"""
+    return [{
+        'title': _title(rng),
+        'description': 'Descripción del juego',
+        'image_url': f'https://cdn.example/{i}/thumb.jpg',
+        'end_date': '2026-10-08T15:00:00.000Z',
+        'namespace': f'ns-{i}',
+        'id': f'offer-{i}'
+    } for i in range(size)]
+
+def make_relevance(games: List[Dict], rng: random.Random) -> List[Dict]:
+    return [{
+        'title': game['title'],
+        'rating': round(rng.uniform(2.5, 4.8), 1),
+        'popularity_score': rng.randint(10, 2000),
+        'review_count': rng.randint(0, 5000),
+        'metacritic_score': rng.randint(50, 95),
+        'genres': ['Action', 'RPG'],
+        'sources': ['RAWG'],
+        'relevance_level': '⭐ ALTA - Juego popular con buenas valoraciones'
+    } for game in games]
+
+# ---------------------------------------------------------------------------
+# Casos
+# ---------------------------------------------------------------------------
+
+def isolate(work_dir: str):
+    """Sin red, sin caché persistente ni estado real: todo va a `work_dir`.
+
+    Debe llamarse antes de importar config (Components importa los módulos).
+    """
+    os.environ.update({
+        'RELEVANCE_ENABLED': 'false',
+        'RELEVANCE_CACHE_ENABLED': 'false',
+        'STEAM_INDEX_ENABLED': 'false',
+        'IMAGE_INLINE_ENABLED': 'false',
+        'GGDEALS_API_KEY': '',
+        'STATE_LOG_FILE': os.path.join(work_dir, 'games_state.jsonl'),
+        'EPIC_FEED_CACHE_FILE': os.path.join(work_dir, 'epic_feed_cache.json'),
+        'SUBSCRIBERS_FILE': os.path.join(work_dir, 'subscribers.json'),
+    })
+
+
+class Components:
+    """Instancias reales de los componentes, creadas sin tocar la red"""
+
+    def __init__(self):
+        from epic_games_monitor import EpicGamesMonitor
+        from ggdeals_monitor import GGDealsMonitor
+        from game_relevance import GameRelevanceEvaluator
+        from email_renderer import EmailRenderer
+        from main import EpicGamesNotifier
+
+        self.epic = EpicGamesMonitor()
+        self.ggdeals = GGDealsMonitor()
+        self.relevance = GameRelevanceEvaluator()
+        self.renderer = EmailRenderer()
+        self.notifier = EpicGamesNotifier()
+
+    def close(self):
+        self.relevance.close()
+        self.notifier.close()
+
+
+def build_cases(components: Components, sizes: List[int], recorded: Dict[str, object],
+                work_dir: str) -> List[Tuple[str, int, Callable[[], Callable[[], object]]]]:
+    """Devuelve (nombre, tamaño, preparar); preparar genera los datos y devuelve la función a medir"""
+    c = components
+    cases = []
+
+    def epic_api(size):
+        # Incluye json.loads, como response.json() en la descarga real
+        content = json.dumps(make_epic_payload(size, random.Random(size))).encode('utf-8')
+        return lambda: c.epic._extract_free_games_from_api(json.loads(content))
+
+    def ggdeals_filter(size):
+        bundles = make_bundles(size, random.Random(size))
+        return lambda: c.ggdeals._filter_high_discount_games(bundles, 80)
+
+    def ggdeals_sort(size):
+        deals = make_deals(size, random.Random(size))
+        return lambda: c.ggdeals._sort_games_by_quality(deals)
+
+    def ggdeals_top_k(size):
+        deals = make_deals(size, random.Random(size))
+        return lambda: c.ggdeals._select_top_games(deals, 4)
+
+    def relevance_basic(size):
+        titles = [_title(random.Random(i)) for i in range(size)]
+        return lambda: [c.relevance._basic_relevance_evaluation(title) for title in titles]
+
+    def games_changed(size):
+        rng = random.Random(size)
+        previous = make_epic_games(size, rng)
+        # La mitad de las ofertas cambian de promoción
+        current = [dict(game, end_date='2026-10-15T15:00:00.000Z') if i % 2 else game
+                   for i, game in enumerate(previous)]
+        return lambda: c.notifier.games_have_changed(current, previous)
+
+    def steam_index_lookup(size):
+        from steam_index import SteamAppIndex, build_index
+
+        rng = random.Random(size)
+        titles = [_title(rng) for _ in range(size)]
+        path = os.path.join(work_dir, f'steam_apps_{size}.idx')
+        build_index(((appid, title) for appid, title in enumerate(titles, start=10)), path)
+        index = SteamAppIndex(path)
+        # Un tercio exactos, un tercio con sufijo de edición y un tercio sin resultado
+        queries = [title if i % 3 == 0 else f"{title}: Deluxe Edition" if i % 3 == 1 else f"{title} Zz{i}"
+                   for i, title in enumerate(titles)]
+        return lambda: [index.find(query) for query in queries]
+
+    def title_search(size):
+        from titles import TrigramIndex
+
+        rng = random.Random(size)
+        index = TrigramIndex()
+        for _ in range(size):
+            index.add(_title(rng))
+        # Consultas con sufijos de edición y erratas, como los títulos de GG.deals frente a RAWG
+        queries = [f"{_title(rng)} GOTY Edition" if i % 2 else _title(rng).replace('a', 'e') for i in range(100)]
+        return lambda: [index.best(query, 0.5) for query in queries]
+
+    def render_combined(size):
+        rng = random.Random(size)
+        epic_games = make_epic_games(size, rng)
+        relevance = make_relevance(epic_games, rng)
+        deals = make_deals(size, rng)
+        return lambda: c.renderer.render_combined(epic_games, relevance, deals)
+
+    for size in sizes:
+        cases.append(('epic_extract_api', size, lambda s=size: epic_api(s)))
+        cases.append(('ggdeals_filter', size, lambda s=size: ggdeals_filter(s)))
+        cases.append(('ggdeals_sort', size, lambda s=size: ggdeals_sort(s)))
+        cases.append(('ggdeals_top_k', size, lambda s=size: ggdeals_top_k(s)))
+        cases.append(('relevance_basic', size, lambda s=size: relevance_basic(s)))
+        cases.append(('games_have_changed', size, lambda s=size: games_changed(s)))
+        cases.append(('steam_index_lookup', size, lambda s=size: steam_index_lookup(s)))
+        cases.append(('title_search', size, lambda s=size: title_search(s)))
+        if size <= RENDER_MAX_ITEMS:
+            cases.append(('render_combined', size, lambda s=size: render_combined(s)))
+
+    # Respuestas grabadas (mismo formato que las APIs)
+    if 'epic_feed' in recorded:
+        payload = recorded['epic_feed']
+        size = len(payload.get('data', {}).get('Catalog', {}).get('searchStore', {}).get('elements', []))
+        content = json.dumps(payload).encode('utf-8')
+        cases.append(('recorded_epic_extract_api', size,
+                      lambda: lambda: c.epic._extract_free_games_from_api(json.loads(content))))
+    if 'ggdeals_bundles' in recorded:
+        bundles = recorded['ggdeals_bundles'].get('data', {}).get('bundles', [])
+        cases.append(('recorded_ggdeals_filter', len(bundles),
+                      lambda: lambda: c.ggdeals._filter_high_discount_games(bundles, 80)))
+
+    return cases
+
+def load_recorded(payload_dir: Optional[str]) -> Dict[str, object]:
+    """Carga epic_feed.json y ggdeals_bundles.json (respuestas completas de las APIs) si existen"""
+    recorded = {}
+    if not payload_dir:
+        return recorded
+    for name in ('epic_feed', 'ggdeals_bundles'):
+        path = os.path.join(payload_dir, f'{name}.json')
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                recorded[name] = json.load(f)
+    return recorded
+
+# ---------------------------------------------------------------------------
+# Medición
+# ---------------------------------------------------------------------------
+
+def measure(func: Callable[[], object], size: int, repeat: int) -> Dict:
+    """Mejor tiempo de `repeat` ejecuciones y memoria pico en una ejecución aparte"""
+    best = None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started_at
+        best = elapsed if best is None else min(best, elapsed)
+
+    # tracemalloc ralentiza la ejecución, por eso no se mide a la vez que el tiempo
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': best,
+        'items_per_second': size / best if best > 0 else float('inf'),
+        'peak_kb': peak / 1024
+    }
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Casos más lentos o con más memoria que la referencia en más de `threshold`"""
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        if result['items_per_second'] < reference['items_per_second'] * (1 - threshold):
+            regressions.append(
+                f"{key}: {result['items_per_second']:,.0f} elem/s frente a {reference['items_per_second']:,.0f}"
+            )
+        # Por debajo de 64 KB el pico de memoria es ruido
+        if result['peak_kb'] > max(64.0, reference['peak_kb'] * (1 + threshold)):
+            regressions.append(f"{key}: pico de {result['peak_kb']:,.0f} KB frente a {reference['peak_kb']:,.0f} KB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de parsers, puntuadores y renderizadores")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Tamaños separados por comas')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones por caso (se toma la mejor)')
+    parser.add_argument('--only', default=None, help='Ejecuta solo los casos cuyo nombre contenga este texto')
+    parser.add_argument('--payload-dir', default=None,
+                        help='Directorio con respuestas grabadas (epic_feed.json, ggdeals_bundles.json)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Archivo JSON de referencia')
+    parser.add_argument('--save-baseline', action='store_true', help='Guarda los resultados como referencia')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Regresión tolerada (0.25 = 25%% más lento o con más memoria)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    results = {}
+
+    # El directorio temporal se borra al terminar, aunque falle algún caso
+    with tempfile.TemporaryDirectory(prefix='benchmark-') as work_dir:
+        # Se respetan los ajustes de .env salvo los que isolate fija para no tocar red ni estado
+        from main import load_environment
+        load_environment()
+        isolate(work_dir)
+        components = Components()
+        try:
+            print(f"{'caso':<30} {'tamaño':>8} {'tiempo (ms)':>12} {'elem/s':>14} {'pico (KB)':>12}")
+            for name, size, prepare in build_cases(components, sizes, load_recorded(args.payload_dir), work_dir):
+                if args.only and args.only not in name:
+                    continue
+                func = prepare()
+                result = measure(func, size, args.repeat)
+                results[f"{name}[{size}]"] = result
+                print(f"{name:<30} {size:>8} {result['seconds'] * 1000:>12.2f} "
+                      f"{result['items_per_second']:>14,.0f} {result['peak_kb']:>12,.1f}")
+        finally:
+            components.close()
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\n💾 Referencia guardada en {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ Regresiones respecto a {args.baseline} (umbral {args.threshold:.0%}):")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print(f"\n✅ Sin regresiones respecto a {args.baseline} (umbral {args.threshold:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,133 @@
 import os
-from dotenv import load_dotenv
 
-# Cargar variables de entorno
-load_dotenv()
+# Las variables de entorno (.env) las carga el punto de entrada (main.load_environment)
 
 # Configuración de Epic Games
 EPIC_GRAPHQL_URL = "https://store.epicgames.com/graphql"
 EPIC_FREE_GAMES_URL = "https://store.epicgames.com/es-ES/free-games"
 
 # Configuración de email
-EMAIL_SMTP_SERVER = "smtp.gmail.com"
-EMAIL_SMTP_PORT = 587
+EMAIL_SMTP_SERVER = os.getenv("EMAIL_SMTP_SERVER", "smtp.gmail.com")
+EMAIL_SMTP_PORT = int(os.getenv("EMAIL_SMTP_PORT", "587"))
+EMAIL_SMTP_USE_STARTTLS = os.getenv("EMAIL_SMTP_USE_STARTTLS", "true").lower() == "true"
+EMAIL_SMTP_POOL_SIZE = int(os.getenv("EMAIL_SMTP_POOL_SIZE", "3"))
+# Timeout (segundos) de conexión y de cada comando SMTP
+EMAIL_SMTP_TIMEOUT = float(os.getenv("EMAIL_SMTP_TIMEOUT", "30"))
 EMAIL_FROM = os.getenv("EMAIL_FROM")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+# Uno o varios destinatarios separados por comas
 EMAIL_TO = os.getenv("EMAIL_TO")
+# Registro de suscriptores con filtros (JSON); si no existe se usa EMAIL_TO sin filtros
+SUBSCRIBERS_FILE = os.getenv("SUBSCRIBERS_FILE", "subscribers.json")
+# Imágenes de los juegos incrustadas en el correo (cid:), descargadas una vez por URL y reducidas
+# al ancho del correo (requiere Pillow; sin él solo se incrustan las que ya pesan poco)
+IMAGE_INLINE_ENABLED = os.getenv("IMAGE_INLINE_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_MAX_WIDTH = int(os.getenv("IMAGE_MAX_WIDTH", "600"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "80"))
+IMAGE_MAX_INLINE_BYTES = int(os.getenv("IMAGE_MAX_INLINE_BYTES", "262144"))
+IMAGE_PREFETCH_WORKERS = int(os.getenv("IMAGE_PREFETCH_WORKERS", "4"))
+IMAGE_CACHE_MAX_AGE_DAYS = float(os.getenv("IMAGE_CACHE_MAX_AGE_DAYS", "30"))
 
 # Configuración de APIs externas para relevancia
 RAWG_API_KEY = os.getenv("RAWG_API_KEY", "")
 STEAM_API_KEY = os.getenv("STEAM_API_KEY", "")
+# Resultados de búsqueda de RAWG entre los que se elige el más parecido al título, y similitud
+# mínima (0..1, trigramas del título canónico) para aceptar una coincidencia aproximada
+RAWG_SEARCH_RESULTS = int(os.getenv("RAWG_SEARCH_RESULTS", "5"))
+TITLE_MATCH_MIN_SIMILARITY = float(os.getenv("TITLE_MATCH_MIN_SIMILARITY", "0.5"))
+# Índice local de apps de Steam (títulos -> appid sin una petición por título). Se reconstruye con
+# `python steam_index.py refresh` o, en modo daemon, en segundo plano cuando es más antiguo que
+# STEAM_INDEX_MAX_AGE_HOURS
+STEAM_INDEX_ENABLED = os.getenv("STEAM_INDEX_ENABLED", "true").lower() == "true"
+STEAM_INDEX_FILE = os.getenv("STEAM_INDEX_FILE", "steam_apps.idx")
+STEAM_INDEX_MAX_AGE_HOURS = float(os.getenv("STEAM_INDEX_MAX_AGE_HOURS", "168"))
+# Tiempo máximo (segundos) para descargar la lista de apps y reconstruir el índice
+STEAM_INDEX_REFRESH_DEADLINE_SECONDS = float(os.getenv("STEAM_INDEX_REFRESH_DEADLINE_SECONDS", "300"))
 
 # Configuración de GG.deals API
 GGDEALS_API_KEY = os.getenv("GGDEALS_API_KEY", "")
+# Paginación de /bundles/active/: páginas simultáneas, peticiones por segundo al host de la API y tope de páginas
+GGDEALS_MAX_CONCURRENCY = int(os.getenv("GGDEALS_MAX_CONCURRENCY", "4"))
+GGDEALS_RATE_LIMIT = float(os.getenv("GGDEALS_RATE_LIMIT", "2"))
+GGDEALS_MAX_PAGES = int(os.getenv("GGDEALS_MAX_PAGES", "50"))
 GGDEALS_BASE_URL = "https://api.gg.deals/v1"
 
+# Tablas de palabras clave y franquicias compartidas por la relevancia y la puntuación de ofertas
+KEYWORDS_FILE = os.getenv("KEYWORDS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "keywords.json"))
+
 # Configuración general
 MAX_GAMES_TO_PROCESS = 4
+
+# Evaluación de relevancia concurrente (1 = modo secuencial)
+RELEVANCE_MAX_WORKERS = int(os.getenv("RELEVANCE_MAX_WORKERS", "4"))
+
+# Etapa de relevancia (si se desactiva, no se importa game_relevance)
+RELEVANCE_ENABLED = os.getenv("RELEVANCE_ENABLED", "true").lower() == "true"
+
+# Caché persistente de relevancia (segundos)
+RELEVANCE_CACHE_ENABLED = os.getenv("RELEVANCE_CACHE_ENABLED", "true").lower() == "true"
+RELEVANCE_CACHE_FILE = os.getenv("RELEVANCE_CACHE_FILE", "relevance_cache.db")
+RELEVANCE_CACHE_TTL = int(os.getenv("RELEVANCE_CACHE_TTL", str(7 * 24 * 3600)))
+RELEVANCE_CACHE_MAX_ENTRIES = int(os.getenv("RELEVANCE_CACHE_MAX_ENTRIES", "5000"))
+# Resultados que solo tienen la evaluación básica (ninguna fuente conoce el título): TTL corto
+RELEVANCE_CACHE_NEGATIVE_TTL = int(os.getenv("RELEVANCE_CACHE_NEGATIVE_TTL", str(6 * 3600)))
+RELEVANCE_CACHE_STALE_WHILE_REVALIDATE = os.getenv("RELEVANCE_CACHE_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+RELEVANCE_CACHE_MAX_STALE = int(os.getenv("RELEVANCE_CACHE_MAX_STALE", str(30 * 24 * 3600)))
+# Antiguo estado (solo se usa para migrar al log de estado)
 DATABASE_FILE = "last_games.json"
 
+# Log de estado de promociones (JSONL de solo anexado, indexado por namespace/id)
+STATE_LOG_FILE = os.getenv("STATE_LOG_FILE", "games_state.jsonl")
+STATE_RETENTION_DAYS = int(os.getenv("STATE_RETENTION_DAYS", "365"))
+STATE_COMPACT_THRESHOLD = int(os.getenv("STATE_COMPACT_THRESHOLD", "500"))
+
+# Modo daemon (python main.py --daemon): intervalo y jitter entre sondeos en segundos
+DAEMON_INTERVAL_SECONDS = float(os.getenv("DAEMON_INTERVAL_SECONDS", "300"))
+DAEMON_JITTER_SECONDS = float(os.getenv("DAEMON_JITTER_SECONDS", "30"))
+
+# Regiones del feed de promociones de Epic ("locale:country" separados por comas)
+EPIC_REGIONS = os.getenv("EPIC_REGIONS", "es-ES:ES")
+
+# Validadores HTTP (ETag / Last-Modified / digest) del feed de promociones de Epic
+EPIC_FEED_CACHE_FILE = os.getenv("EPIC_FEED_CACHE_FILE", "epic_feed_cache.json")
+
+# Decodificación JSON en streaming de las páginas de bundles de GG.deals
+JSON_STREAM_DECODING = os.getenv("JSON_STREAM_DECODING", "true").lower() == "true"
+
+# Capa HTTP: timeouts (segundos), reintentos y presupuesto por ejecución (0 = sin límite)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "8"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+# Presupuesto de tiempo de una ejecución completa; al agotarse se cortan las peticiones y esperas pendientes
+RUN_DEADLINE_SECONDS = float(os.getenv("RUN_DEADLINE_SECONDS", "240"))
+# Límite adaptativo por host compartido por todo el proceso: ritmo máximo (peticiones por segundo,
+# 0 = sin límite) y concurrencia máxima por defecto, y por host ("host=ritmo:concurrencia" separados
+# por comas). La concurrencia y el ritmo se reducen a la mitad ante 429/503 o si la latencia supera
+# HTTP_LATENCY_TOLERANCE veces la habitual, y se recuperan poco a poco; Retry-After se respeta hasta
+# HTTP_RETRY_AFTER_MAX segundos
+HTTP_HOST_RATE_LIMIT = float(os.getenv("HTTP_HOST_RATE_LIMIT", "0"))
+HTTP_HOST_MAX_CONCURRENCY = int(os.getenv("HTTP_HOST_MAX_CONCURRENCY", "8"))
+HTTP_HOST_LIMITS = os.getenv("HTTP_HOST_LIMITS", "api.rawg.io=5:4,store.steampowered.com=4:4")
+HTTP_LATENCY_TOLERANCE = float(os.getenv("HTTP_LATENCY_TOLERANCE", "3"))
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "60"))
+# Métricas por ejecución: archivo de texto Prometheus (o JSON si acaba en .json); vacío = desactivado
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_HISTOGRAMS = os.getenv("METRICS_HISTOGRAMS", "true").lower() == "true"
+METRICS_BUCKETS = [float(b) for b in os.getenv("METRICS_BUCKETS", "0.05,0.1,0.25,0.5,1,2.5,5,10,30").split(",") if b.strip()]
+
+# Perfilado con --profile / --profile-stage: directorio de informes, filas por informe y marcos por asignación
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "30"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+
+# Grabación / reproducción de respuestas HTTP para pruebas sin red (ver replay.py)
+HTTP_RECORD_DIR = os.getenv("HTTP_RECORD_DIR", "")
+HTTP_REPLAY_URL = os.getenv("HTTP_REPLAY_URL", "")
+
 # Headers para requests
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
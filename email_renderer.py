@@ -0,0 +1,341 @@
+from datetime import datetime
+from string import Template
+from typing import Dict, List, Optional
+
+DEFAULT_LOCALE = "es-ES"
+EPIC_STORE_URL_TEMPLATE = "https://store.epicgames.com/{locale}/free-games"
+EPIC_STORE_URL = EPIC_STORE_URL_TEMPLATE.format(locale=DEFAULT_LOCALE)
+GGDEALS_URL = "https://gg.deals"
+
+# Plantillas compiladas una sola vez al importar el módulo
+EMAIL_CSS = """
+                body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }
+                .container { max-width: 800px; margin: 0 auto; background-color: white; border-radius: 10px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
+                .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; }
+                .header h1 { margin: 0; font-size: 28px; }
+                .header p { margin: 10px 0 0 0; opacity: 0.9; }
+                .section-header { background: #f8f9fa; padding: 20px; border-bottom: 3px solid #667eea; margin: 0; }
+                .section-header h2 { margin: 0; color: #333; font-size: 22px; }
+                .game-card { border-bottom: 1px solid #eee; padding: 25px; }
+                .game-card:last-child { border-bottom: none; }
+                .game-title { color: #333; font-size: 22px; font-weight: bold; margin: 0 0 10px 0; }
+                .game-meta { display: flex; flex-wrap: wrap; gap: 15px; margin: 15px 0; }
+                .meta-item { background: #f8f9fa; padding: 8px 12px; border-radius: 5px; font-size: 14px; }
+                .relevance { background: #e3f2fd; border-left: 4px solid #2196f3; padding: 15px; margin: 15px 0; border-radius: 0 5px 5px 0; }
+                .deal-info { background: #fff3e0; border-left: 4px solid #ff9800; padding: 15px; margin: 15px 0; border-radius: 0 5px 5px 0; }
+                .description { color: #666; line-height: 1.6; margin: 15px 0; }
+                .game-image { max-width: 100%; height: auto; border-radius: 8px; margin: 15px 0; }
+                .footer { background: #f8f9fa; padding: 20px; text-align: center; color: #666; font-size: 14px; }
+                .epic-link { display: inline-block; background: #0078f2; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; margin: 10px 5px; }
+                .deal-link { display: inline-block; background: #ff9800; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; margin: 10px 5px; }
+                .epic-link:hover { background: #0056b3; }
+                .deal-link:hover { background: #f57c00; }
+"""
+
+HTML_HEAD = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>$css</style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>$heading</h1>
+            <p>$subheading</p>
+        </div>
+""")
+
+HTML_SECTION = Template("""
+        <div class="section-header">
+            <h2>$title</h2>
+        </div>
+""")
+
+HTML_EPIC_CARD = Template("""
+        <div class="game-card">
+            <$tag class="game-title">$title</$tag>
+            <div class="game-meta">
+                <div class="meta-item">📅 Expira: $end_date</div>
+                <div class="meta-item">🆓 Precio: GRATIS</div>
+                <div class="meta-item">🎯 Juego #$number</div>
+            </div>
+$extra
+            <a href="$store_url" class="epic-link" target="_blank">
+                🎮 Reclamar en Epic Games Store
+            </a>
+        </div>
+""")
+
+HTML_DEAL_CARD = Template("""
+        <div class="game-card">
+            <h3 class="game-title">$title</h3>
+            <div class="game-meta">
+                <div class="meta-item">💰 Precio: ~$$$price_per_game $currency</div>
+                <div class="meta-item">🔥 Descuento: ~$discount%</div>
+                <div class="meta-item">📅 Expira: $end_date</div>
+            </div>
+            <div class="deal-info">
+                <strong>📦 Bundle:</strong> $bundle_title<br>
+                <strong>🎮 Juegos en tier:</strong> $games_in_tier<br>
+                <strong>💵 Precio total del bundle:</strong> $$$price $currency$alternatives
+            </div>
+$links
+        </div>
+""")
+
+HTML_FOOTER = Template("""
+        <div class="footer">
+            <p>📧 Notificación automática generada el $generated_at</p>
+            <p>$links</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+TEXT_EPIC_ITEM = Template("""JUEGO #$number: $title
+------------------------------
+${description}Expira: $end_date
+Precio: GRATIS
+$relevance
+🔗 Reclamar: $store_url
+
+$separator
+
+""")
+
+TEXT_DEAL_ITEM = Template("""OFERTA #$number: $title
+------------------------------
+Precio: ~$$$price_per_game $currency
+Descuento: ~$discount%
+Bundle: $bundle_title
+Juegos en tier: $games_in_tier
+Precio total bundle: $$$price $currency
+${alternatives}Expira: $end_date
+$links
+$separator
+
+""")
+
+DATE_FORMATS = ['%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%d']
+
+def format_date(date_str: Optional[str]) -> str:
+    """Formatea una fecha para mostrar"""
+    if not date_str:
+        return "Fecha no disponible"
+
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt).strftime('%d/%m/%Y')
+        except ValueError:
+            continue
+
+    return date_str  # Si no se puede parsear, devolver como está
+
+
+class EmailRenderer:
+    """Construye un modelo de vista y rellena en una pasada las versiones HTML y texto"""
+
+    def build_view_model(self, epic_games: List[Dict], relevance_data: List[Dict],
+                         ggdeals_games: List[Dict], now: Optional[datetime] = None,
+                         locale: Optional[str] = None, image_cids: Optional[Dict[str, str]] = None) -> Dict:
+        """Calcula una sola vez todos los valores que usan ambas versiones del correo.
+
+        `image_cids` ({url: Content-ID}) indica las imágenes que van incrustadas en el
+        mensaje; el resto se enlazan por su URL original.
+        """
+        now = now or datetime.now()
+        image_cids = image_cids or {}
+        epic_items = []
+        for i, game in enumerate(epic_games):
+            relevance = relevance_data[i] if i < len(relevance_data) else {}
+            image_url = game.get('image_url') or ''
+            epic_items.append({
+                'number': i + 1,
+                'title': game.get('title', 'Sin título'),
+                'description': game.get('description') or '',
+                'image_url': image_url,
+                'image_src': f"cid:{image_cids[image_url]}" if image_url in image_cids else image_url,
+                'end_date': format_date(game.get('end_date')),
+                'relevance': self._relevance_view(relevance) if relevance else None
+            })
+
+        deal_items = []
+        for i, game in enumerate(ggdeals_games):
+            deal_items.append({
+                'number': i + 1,
+                'title': game.get('title', 'Sin título'),
+                'price_per_game': game.get('price_per_game', 0),
+                'currency': game.get('currency', 'USD'),
+                'discount': game.get('estimated_discount', 0),
+                'end_date': format_date(game.get('end_date')),
+                'bundle_title': game.get('bundle_title', 'Bundle desconocido'),
+                'games_in_tier': game.get('games_in_tier', 1),
+                'price': game.get('price', 0),
+                'url': game.get('url') or '',
+                'bundle_url': game.get('bundle_url') or '',
+                'alternatives': [{
+                    'bundle_title': alternative.get('bundle_title') or 'Bundle desconocido',
+                    'bundle_url': alternative.get('bundle_url') or '',
+                    'price_per_game': alternative.get('price_per_game', 0),
+                    'currency': alternative.get('currency', 'USD')
+                } for alternative in game.get('alternatives', [])]
+            })
+
+        return {
+            'epic': epic_items,
+            'deals': deal_items,
+            'store_url': EPIC_STORE_URL_TEMPLATE.format(locale=locale or DEFAULT_LOCALE),
+            'date': now.strftime('%d/%m/%Y'),
+            'generated_at': now.strftime('%d/%m/%Y a las %H:%M')
+        }
+
+    def _relevance_view(self, relevance: Dict) -> Dict:
+        rating = relevance.get('rating', 0)
+        popularity = relevance.get('popularity_score', 0)
+        return {
+            'level': relevance.get('relevance_level', 'Desconocida'),
+            'rating': f"{rating:.1f}/5.0" if rating > 0 else '',
+            'popularity': f"{popularity:,} puntos" if popularity > 0 else '',
+            'sources': ', '.join(relevance.get('sources', []))
+        }
+
+    def render_games(self, games: List[Dict], relevance_data: List[Dict],
+                     image_cids: Optional[Dict[str, str]] = None):
+        """Renderiza el correo solo de Epic Games. Devuelve (html, texto)"""
+        view = self.build_view_model(games, relevance_data, [], image_cids=image_cids)
+        return self._render(view, combined=False)
+
+    def render_combined(self, epic_games: List[Dict], relevance_data: List[Dict], ggdeals_games: List[Dict],
+                        locale: Optional[str] = None, image_cids: Optional[Dict[str, str]] = None):
+        """Renderiza el correo combinado Epic Games + GG.deals. Devuelve (html, texto)"""
+        view = self.build_view_model(epic_games, relevance_data, ggdeals_games, locale=locale,
+                                     image_cids=image_cids)
+        return self._render(view, combined=True)
+
+    def _render(self, view: Dict, combined: bool):
+        html = []
+        text = []
+        store_url = view['store_url']
+
+        if combined:
+            html.append(HTML_HEAD.substitute(
+                css=EMAIL_CSS,
+                heading="🎮🔥 Gaming Deals & Free Games",
+                subheading="Epic Games gratuitos y mejores ofertas con descuentos altos"
+            ))
+            text.append(f"🎮🔥 GAMING DEALS & FREE GAMES\nFecha: {view['date']}\n{'=' * 60}\n\n")
+            separator = "=" * 40
+        else:
+            html.append(HTML_HEAD.substitute(
+                css=EMAIL_CSS,
+                heading="🎮 Epic Games - Juegos Gratuitos",
+                subheading="Nuevos juegos disponibles para reclamar"
+            ))
+            text.append(f"🎮 EPIC GAMES - JUEGOS GRATUITOS\nFecha: {view['date']}\n{'=' * 50}\n\n")
+            separator = "=" * 50
+
+        # Sección de Epic Games
+        if view['epic'] and combined:
+            html.append(HTML_SECTION.substitute(title="🎮 Epic Games - Juegos Gratuitos"))
+            text.append("🎮 EPIC GAMES - JUEGOS GRATUITOS\n" + "-" * 40 + "\n\n")
+
+        for item in view['epic']:
+            self._render_epic_item(item, html, text, combined, separator, store_url)
+
+        # Sección de GG.deals
+        if view['deals']:
+            html.append(HTML_SECTION.substitute(title="🔥 GG.deals - Ofertas con 80%+ de Descuento"))
+            text.append("🔥 GG.DEALS - OFERTAS CON 80%+ DE DESCUENTO\n" + "-" * 50 + "\n\n")
+
+        for item in view['deals']:
+            self._render_deal_item(item, html, text)
+
+        if combined:
+            footer_links = (f'🔗 <a href="{store_url}" target="_blank">Epic Games Store</a> |\n'
+                            f'               <a href="{GGDEALS_URL}" target="_blank">GG.deals</a>')
+            text.append(f"Notificación generada automáticamente el {view['generated_at']}\n"
+                        f"Epic Games Store: {store_url}\nGG.deals: {GGDEALS_URL}\n")
+        else:
+            footer_links = f'🔗 <a href="{store_url}" target="_blank">Visitar Epic Games Store</a>'
+            text.append(f"Notificación generada automáticamente el {view['generated_at']}\n")
+
+        html.append(HTML_FOOTER.substitute(generated_at=view['generated_at'], links=footer_links))
+        return ''.join(html), ''.join(text)
+
+    def _render_epic_item(self, item: Dict, html: List[str], text: List[str], combined: bool, separator: str,
+                          store_url: str):
+        extra = []
+        if item['image_src']:
+            extra.append(f'            <img src="{item["image_src"]}" alt="{item["title"]}" class="game-image">\n')
+        if item['description']:
+            extra.append(f'            <div class="description">{item["description"]}</div>\n')
+
+        relevance = item['relevance']
+        relevance_text = ''
+        if relevance:
+            lines = [f"<strong>Nivel:</strong> {relevance['level']}<br>"]
+            text_lines = [f"\n📊 RELEVANCIA:\nNivel: {relevance['level']}\n"]
+            if relevance['rating']:
+                lines.append(f"<strong>Puntuación:</strong> {relevance['rating']}<br>")
+                text_lines.append(f"Puntuación: {relevance['rating']}\n")
+            if relevance['popularity']:
+                lines.append(f"<strong>Popularidad:</strong> {relevance['popularity']}<br>")
+                text_lines.append(f"Popularidad: {relevance['popularity']}\n")
+            # El correo solo de Epic Games muestra además las fuentes
+            if relevance['sources'] and not combined:
+                lines.append(f"<strong>Fuentes:</strong> {relevance['sources']}<br>")
+            extra.append('            <div class="relevance">\n                <strong>📊 Análisis de Relevancia:</strong><br>\n                '
+                         + '\n                '.join(lines) + '\n            </div>\n')
+            relevance_text = ''.join(text_lines)
+
+        html.append(HTML_EPIC_CARD.substitute(
+            tag='h3' if combined else 'h2',
+            title=item['title'],
+            end_date=item['end_date'],
+            number=item['number'],
+            extra=''.join(extra),
+            store_url=store_url
+        ))
+        text.append(TEXT_EPIC_ITEM.substitute(
+            number=item['number'],
+            title=item['title'],
+            description=f"Descripción: {item['description']}\n" if item['description'] else '',
+            end_date=item['end_date'],
+            relevance=relevance_text,
+            store_url=store_url,
+            separator=separator
+        ))
+
+    def _render_deal_item(self, item: Dict, html: List[str], text: List[str]):
+        links = []
+        text_links = []
+        if item['url']:
+            links.append(f'            <a href="{item["url"]}" class="deal-link" target="_blank">🔗 Ver en GG.deals</a>\n')
+            text_links.append(f"Ver juego: {item['url']}\n")
+        if item['bundle_url']:
+            links.append(f'            <a href="{item["bundle_url"]}" class="deal-link" target="_blank">📦 Ver Bundle Completo</a>\n')
+            text_links.append(f"Ver bundle: {item['bundle_url']}\n")
+
+        # Otros bundles que incluyen el mismo juego a mayor precio por juego
+        html_alternatives = ''
+        text_alternatives = ''
+        if item['alternatives']:
+            html_parts = []
+            text_parts = []
+            for alternative in item['alternatives']:
+                label = f"{alternative['bundle_title']} (~${alternative['price_per_game']} {alternative['currency']})"
+                if alternative['bundle_url']:
+                    html_parts.append(f'<a href="{alternative["bundle_url"]}" target="_blank">{label}</a>')
+                else:
+                    html_parts.append(label)
+                text_parts.append(label)
+            html_alternatives = f"<br>\n                <strong>🔁 También en:</strong> {', '.join(html_parts)}"
+            text_alternatives = f"También en: {', '.join(text_parts)}\n"
+
+        values = {key: item[key] for key in ('number', 'title', 'price_per_game', 'currency', 'discount',
+                                             'end_date', 'bundle_title', 'games_in_tier', 'price')}
+        html.append(HTML_DEAL_CARD.substitute(values, links=''.join(links), alternatives=html_alternatives))
+        text.append(TEXT_DEAL_ITEM.substitute(values, links=''.join(text_links), alternatives=text_alternatives,
+                                              separator="=" * 40))
@@ -1,18 +1,71 @@
-import requests
+import hashlib
 import json
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
-from config import EPIC_GRAPHQL_URL, EPIC_FREE_GAMES_URL, HEADERS, EPIC_FREE_GAMES_QUERY
-from bs4 import BeautifulSoup
+from typing import Iterable, List, Dict, Optional, Tuple, TYPE_CHECKING
+from http_client import HttpSession
+from titles import canonical_title
+from config import (
+    EPIC_FREE_GAMES_URL, HEADERS, EPIC_FEED_CACHE_FILE, EPIC_REGIONS,
+    MAX_GAMES_TO_PROCESS
+)
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def parse_regions(value: str) -> List[Tuple[str, str]]:
+    """Convierte "es-ES:ES,en-US:US" en [('es-ES', 'ES'), ('en-US', 'US')]"""
+    regions = []
+    for item in value.split(','):
+        if ':' in item:
+            locale, country = item.split(':', 1)
+            regions.append((locale.strip(), country.strip()))
+    return regions or [('es-ES', 'ES')]
+
 class EpicGamesMonitor:
     def __init__(self):
-        self.session = requests.Session()
+        self.session = HttpSession()
         self.session.headers.update(HEADERS)
+        self.regions = parse_regions(EPIC_REGIONS)
+        self.max_games = MAX_GAMES_TO_PROCESS
+        self.feed_cache_file = EPIC_FEED_CACHE_FILE
+        # Validadores y últimos juegos por región ("locale:country")
+        self.feed_validators = self._load_feed_validators()
+        self._pending_feed_validators = {}
+        self._validators_lock = threading.Lock()
+        # True cuando el último sondeo confirmó que el feed no ha cambiado
+        self.feed_unchanged = False
+
+    def _load_feed_validators(self) -> Dict:
+        """Carga ETag, Last-Modified, digest y juegos de la última respuesta procesada por región"""
+        try:
+            if os.path.exists(self.feed_cache_file):
+                with open(self.feed_cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # Una entrada por región; se ignoran formatos anteriores
+                return {region: value for region, value in data.items() if isinstance(value, dict)}
+        except Exception as e:
+            logger.error(f"Error cargando validadores del feed: {e}")
+        return {}
+
+    def commit_feed_state(self):
+        """Confirma los validadores del último feed una vez procesado con éxito"""
+        if not self._pending_feed_validators:
+            return
+
+        try:
+            validators = dict(self.feed_validators, **self._pending_feed_validators)
+            with open(self.feed_cache_file, 'w', encoding='utf-8') as f:
+                json.dump(validators, f, indent=2, ensure_ascii=False)
+            self.feed_validators = validators
+            self._pending_feed_validators = {}
+        except Exception as e:
+            logger.error(f"Error guardando validadores del feed: {e}")
     
     def get_free_games_graphql(self) -> List[Dict]:
         """Obtiene juegos gratuitos usando GraphQL API"""
@@ -25,29 +78,114 @@ class EpicGamesMonitor:
             return self.get_free_games_scraping()
 
     def get_free_games_alternative_api(self) -> List[Dict]:
-        """Obtiene juegos usando API alternativa"""
+        """Obtiene juegos usando API alternativa, para todas las regiones configuradas"""
+        try:
+            if len(self.regions) == 1:
+                results = [self._fetch_region(*self.regions[0])]
+            else:
+                # Todas las regiones en paralelo sobre el mismo pool de conexiones
+                with ThreadPoolExecutor(max_workers=len(self.regions), thread_name_prefix='epic-region') as executor:
+                    results = list(executor.map(lambda region: self._fetch_region(*region), self.regions))
+
+            if all(result['unchanged'] for result in results):
+                self.feed_unchanged = True
+                return []
+
+            return self._merge_regions(results)
+
+        except Exception as e:
+            logger.error(f"Error con API alternativa: {e}")
+            return []
+
+    def _fetch_region(self, locale: str, country: str) -> Dict:
+        """Descarga el feed de una región con GET condicional.
+
+        Devuelve {'region', 'games', 'unchanged'}; si el feed no cambió se reutilizan
+        los juegos guardados de la última respuesta procesada.
+        """
+        region = f"{locale}:{country}"
+        result = {'region': region, 'games': [], 'unchanged': False}
+
         try:
             # Usar la API de Epic Games Store que es más estable
             url = "https://store-site-backend-static.ak.epicgames.com/freeGamesPromotions"
             params = {
-                'locale': 'es-ES',
-                'country': 'ES',
-                'allowCountries': 'ES'
+                'locale': locale,
+                'country': country,
+                'allowCountries': country
             }
 
-            response = self.session.get(url, params=params)
+            # GET condicional solo si tenemos los juegos de la última respuesta
+            validators = self.feed_validators.get(region, {})
+            headers = {}
+            if 'games' in validators:
+                if validators.get('etag'):
+                    headers['If-None-Match'] = validators['etag']
+                if validators.get('last_modified'):
+                    headers['If-Modified-Since'] = validators['last_modified']
+
+            response = self.session.get(url, params=params, headers=headers)
+
+            if response.status_code == 304:
+                logger.info(f"Feed de promociones {region} sin cambios (304 Not Modified)")
+                result.update(games=validators['games'], unchanged=True)
+                return result
+
             response.raise_for_status()
 
-            data = response.json()
-            return self._extract_free_games_from_api(data)
+            # Comparar el digest antes de parsear el JSON
+            digest = hashlib.sha256(response.content).hexdigest()
+            if 'games' in validators and digest == validators.get('digest'):
+                logger.info(f"Feed de promociones {region} sin cambios (mismo digest)")
+                result.update(games=validators['games'], unchanged=True)
+                return result
+
+            # El feed es pequeño y ya está en memoria para el digest: json.loads es lo más rápido
+            games = self._extract_free_games_from_api(response.json())
+            with self._validators_lock:
+                self._pending_feed_validators[region] = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'digest': digest,
+                    'checked_at': datetime.now(timezone.utc).isoformat(),
+                    'games': games
+                }
+            result['games'] = games
+            return result
 
         except Exception as e:
-            logger.error(f"Error con API alternativa: {e}")
-            return []
+            logger.error(f"Error con API alternativa ({region}): {e}")
+            return result
+
+    def _merge_regions(self, results: List[Dict]) -> List[Dict]:
+        """Une las ofertas de todas las regiones por namespace/id registrando su disponibilidad.
+
+        El límite de juegos se aplica a cada región antes de unirlas, para no
+        perder los que solo se ofrecen en una región posterior.
+        """
+        merged = {}
+
+        for result in results:
+            for game in result['games'][:self.max_games]:
+                if game.get('namespace') and game.get('id'):
+                    key = (game['namespace'], game['id'])
+                else:
+                    key = canonical_title(game.get('title', ''))
+
+                if key not in merged:
+                    merged[key] = dict(game, regions=[])
+                merged[key]['regions'].append(result['region'])
+
+        if len(results) > 1:
+            logger.info(f"{len(merged)} ofertas únicas en {len(results)} regiones")
+        return list(merged.values())
     
     def get_free_games_scraping(self) -> List[Dict]:
         """Método alternativo usando web scraping"""
         try:
+            # bs4 solo se importa cuando se usa el scraping
+            from bs4 import BeautifulSoup
+
             response = self.session.get(EPIC_FREE_GAMES_URL)
             response.raise_for_status()
             
@@ -60,19 +198,27 @@ class EpicGamesMonitor:
     
     def _extract_free_games_from_api(self, data: Dict) -> List[Dict]:
         """Extrae información de juegos de la API alternativa"""
+        elements = data.get('data', {}).get('Catalog', {}).get('searchStore', {}).get('elements', [])
+        return self._extract_free_games_from_elements(elements)
+
+    def _extract_free_games_from_elements(self, elements: Iterable[Dict]) -> List[Dict]:
+        """Extrae los primeros juegos gratuitos de los elementos del catálogo"""
         games = []
 
         try:
-            elements = data.get('data', {}).get('Catalog', {}).get('searchStore', {}).get('elements', [])
-
             for element in elements:
                 if self._is_free_promotion(element):
                     game_info = self._extract_game_info_from_element_api(element)
                     if game_info:
                         games.append(game_info)
+                        if len(games) >= 4:  # Solo los primeros 4
+                            break
 
-            return games[:4]  # Solo los primeros 4
+            return games
 
+        except json.JSONDecodeError:
+            # Respuesta inválida: la trata quien descarga el feed
+            raise
         except Exception as e:
             logger.error(f"Error extrayendo juegos de API alternativa: {e}")
             return []
@@ -101,7 +247,7 @@ class EpicGamesMonitor:
             logger.error(f"Error extrayendo juegos de GraphQL: {e}")
             return []
     
-    def _extract_free_games_from_html(self, soup: BeautifulSoup) -> List[Dict]:
+    def _extract_free_games_from_html(self, soup: 'BeautifulSoup') -> List[Dict]:
         """Extrae información de juegos del HTML"""
         games = []
         
@@ -266,11 +412,15 @@ class EpicGamesMonitor:
         """Método principal para obtener juegos gratuitos actuales"""
         logger.info("Obteniendo juegos gratuitos de Epic Games...")
 
+        self.feed_unchanged = False
         games = self.get_free_games_graphql()
 
+        if self.feed_unchanged:
+            return []
+
         if not games:
             logger.warning("No se pudieron obtener juegos, intentando método alternativo...")
-            games = self.get_free_games_scraping()
+            games = self.get_free_games_scraping()[:self.max_games]
 
         if not games:
             logger.warning("No se pudieron obtener juegos reales, usando datos de ejemplo para testing...")
@@ -1,18 +1,173 @@
-import requests
 import logging
-from typing import Dict, Optional
-from config import RAWG_API_KEY, STEAM_API_KEY, HEADERS
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from http_client import Deadline, HttpSession
+from config import (
+    RAWG_API_KEY, HEADERS, RELEVANCE_MAX_WORKERS, RELEVANCE_CACHE_ENABLED, STEAM_INDEX_ENABLED,
+    RAWG_SEARCH_RESULTS, TITLE_MATCH_MIN_SIMILARITY, RELEVANCE_CACHE_NEGATIVE_TTL, RUN_DEADLINE_SECONDS
+)
+from relevance_cache import RelevanceCache
+from metrics import metrics
+from keyword_matcher import get_matcher
+from titles import best_match
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Espera mínima entre intentos de reconstruir el índice de Steam (si la descarga falla)
+STEAM_INDEX_RETRY_SECONDS = 3600
+
 class GameRelevanceEvaluator:
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, refresh_steam_index: bool = False):
+        self.session = HttpSession()
         self.session.headers.update(HEADERS)
-    
+        # Pool propio para consultar RAWG y Steam en paralelo por cada título
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(2, RELEVANCE_MAX_WORKERS * 2),
+            thread_name_prefix='relevance-source'
+        )
+        self.cache = self._open_cache() if RELEVANCE_CACHE_ENABLED else None
+        # Revalidaciones en segundo plano (stale-while-revalidate)
+        self.refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='relevance-refresh')
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        self.steam_index = None
+        # Solo los procesos de larga duración (modo daemon) reconstruyen el índice en segundo
+        # plano; en una ejecución única la descarga no llegaría a usarse
+        self.refresh_steam_index = refresh_steam_index
+        self._steam_index_refreshing = False
+        self._steam_index_attempted_at: Optional[float] = None
+        if STEAM_INDEX_ENABLED:
+            self._load_steam_index()
+
+    def close(self):
+        """Detiene los pools de hilos y cierra la caché, el índice de Steam y la sesión HTTP"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        # Las revalidaciones en curso escriben en la caché: se esperan antes de cerrarla
+        self.refresh_executor.shutdown(wait=True, cancel_futures=True)
+        if self.cache:
+            self.cache.close()
+        if self.steam_index:
+            self.steam_index.close()
+        self.session.close()
+
+    def _open_cache(self) -> Optional[RelevanceCache]:
+        """Abre la caché de relevancia; sin caché si no se puede abrir"""
+        try:
+            return RelevanceCache()
+        except Exception as e:
+            logger.error(f"Error abriendo caché de relevancia: {e}")
+            return None
+
+    def _load_steam_index(self):
+        """Abre el índice local de Steam y programa su reconstrucción si falta o está obsoleto"""
+        from steam_index import SteamAppIndex
+
+        self.steam_index = SteamAppIndex.load()
+        if self.steam_index is None or self.steam_index.is_stale():
+            if not self.refresh_steam_index:
+                logger.info("🗂️ Índice de Steam ausente u obsoleto (python steam_index.py refresh)")
+            self._schedule_steam_index_refresh()
+
+    def _schedule_steam_index_refresh(self):
+        """Reconstruye el índice en segundo plano; mientras tanto se usa el anterior (o la búsqueda web)"""
+        if not self.refresh_steam_index:
+            return
+        with self._refreshing_lock:
+            now = time.monotonic()
+            if self._steam_index_refreshing or (
+                    self._steam_index_attempted_at is not None
+                    and now - self._steam_index_attempted_at < STEAM_INDEX_RETRY_SECONDS):
+                return
+            self._steam_index_refreshing = True
+            self._steam_index_attempted_at = now
+
+        def refresh():
+            from steam_index import SteamAppIndex, refresh_index
+            try:
+                refresh_index()
+                self.steam_index = SteamAppIndex.load()
+            except Exception as e:
+                logger.error(f"Error actualizando el índice de Steam: {e}")
+            finally:
+                with self._refreshing_lock:
+                    self._steam_index_refreshing = False
+
+        self.refresh_executor.submit(refresh)
+
     def evaluate_game_relevance(self, game_title: str) -> Dict:
-        """Evalúa la relevancia de un juego basado en múltiples fuentes"""
+        """Evalúa la relevancia de un juego, usando la caché si está disponible"""
+        if not self.cache:
+            with metrics.timer('relevance_evaluation_duration_seconds', source='upstream'):
+                relevance_data, _ = self._evaluate_uncached(game_title)
+            return relevance_data
+
+        with metrics.timer('relevance_evaluation_duration_seconds', source='cache'):
+            cached, stale = self.cache.get(game_title)
+        if cached is not None:
+            if stale:
+                self._schedule_refresh(game_title)
+            return cached
+
+        with metrics.timer('relevance_evaluation_duration_seconds', source='upstream'):
+            relevance_data, complete = self._evaluate_uncached(game_title)
+        self._store(game_title, relevance_data, complete)
+        return relevance_data
+
+    def _store(self, game_title: str, relevance_data: Dict, complete: bool) -> bool:
+        """Guarda el resultado en la caché si es fiable. Devuelve si se guardó"""
+        if not complete:
+            # Alguna fuente falló (error, 429, deadline): no se fija un resultado degradado
+            # ni se sobrescribe la entrada anterior; se volverá a evaluar en la próxima ejecución
+            return False
+        if relevance_data.get('sources') == ['Evaluación básica']:
+            # Ninguna fuente conoce el título: se guarda poco tiempo por si aparece después
+            self.cache.set(game_title, relevance_data, ttl=RELEVANCE_CACHE_NEGATIVE_TTL)
+        else:
+            self.cache.set(game_title, relevance_data)
+        return True
+
+    def _schedule_refresh(self, game_title: str):
+        """Refresca en segundo plano una entrada obsoleta de la caché"""
+        key = self.cache.normalize_key(game_title)
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            # Sesión y presupuesto propios: el deadline de la ejecución que la programó
+            # puede haberse agotado ya (en modo daemon, la revalidación la sobrevive)
+            session = HttpSession()
+            session.headers.update(HEADERS)
+            session.deadline = Deadline(RUN_DEADLINE_SECONDS)
+            try:
+                relevance_data, complete = self._evaluate_uncached(game_title, session)
+                if self._store(game_title, relevance_data, complete):
+                    logger.info(f"🔄 Relevancia revalidada en segundo plano: {game_title}")
+                else:
+                    logger.warning(f"Revalidación incompleta de {game_title}: se conserva la entrada anterior")
+            except Exception as e:
+                logger.error(f"Error revalidando relevancia de {game_title}: {e}")
+            finally:
+                session.close()
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+
+        self.refresh_executor.submit(refresh)
+
+    def log_cache_stats(self):
+        """Registra las estadísticas de la caché de relevancia"""
+        if self.cache:
+            self.cache.log_stats()
+
+    def _evaluate_uncached(self, game_title: str, session: Optional[HttpSession] = None) -> Tuple[Dict, bool]:
+        """Evalúa la relevancia de un juego basado en múltiples fuentes.
+
+        Devuelve (datos, completo); completo es False si alguna fuente falló.
+        """
+        session = session or self.session
         relevance_data = {
             'title': game_title,
             'rating': 0.0,
@@ -22,14 +177,18 @@ class GameRelevanceEvaluator:
             'sources': []
         }
         
+        # Consultar RAWG y Steam en paralelo
+        rawg_future = self.executor.submit(self._get_rawg_data, game_title, session)
+        steam_future = self.executor.submit(self._get_steam_data, game_title, session)
+
         # Intentar obtener datos de RAWG
-        rawg_data = self._get_rawg_data(game_title)
+        rawg_data, rawg_ok = self._source_result(rawg_future, 'RAWG', game_title)
         if rawg_data:
             relevance_data.update(rawg_data)
             relevance_data['sources'].append('RAWG')
         
         # Intentar obtener datos de Steam (método alternativo)
-        steam_data = self._get_steam_data(game_title)
+        steam_data, steam_ok = self._source_result(steam_future, 'Steam', game_title)
         if steam_data:
             # Combinar datos de Steam con los existentes
             if steam_data.get('rating', 0) > relevance_data.get('rating', 0):
@@ -43,10 +202,19 @@ class GameRelevanceEvaluator:
         # Calcular nivel de relevancia final
         relevance_data['relevance_level'] = self._calculate_relevance_level(relevance_data)
         
-        return relevance_data
+        return relevance_data, rawg_ok and steam_ok
+
+    @staticmethod
+    def _source_result(future, source: str, game_title: str) -> Tuple[Optional[Dict], bool]:
+        """(datos, ok) de la consulta a una fuente; ok es False si la consulta falló"""
+        try:
+            return future.result(), True
+        except Exception as e:
+            logger.error(f"Error obteniendo datos de {source} para {game_title}: {e}")
+            return None, False
     
-    def _get_rawg_data(self, game_title: str) -> Optional[Dict]:
-        """Obtiene datos del juego desde RAWG API"""
+    def _get_rawg_data(self, game_title: str, session: HttpSession) -> Optional[Dict]:
+        """Obtiene datos del juego desde RAWG API (None si no lo encuentra; los errores se propagan)"""
         if not RAWG_API_KEY:
             return None
         
@@ -56,20 +224,24 @@ class GameRelevanceEvaluator:
             params = {
                 'key': RAWG_API_KEY,
                 'search': game_title,
-                'page_size': 1
+                'page_size': RAWG_SEARCH_RESULTS
             }
             
-            response = self.session.get(search_url, params=params)
+            response = session.get(search_url, params=params)
             response.raise_for_status()
             
             data = response.json()
             results = data.get('results', [])
             
-            if not results:
+            # El primer resultado no siempre es el juego (DLC, secuelas, homónimos):
+            # se elige el de título más parecido y se descarta si ninguno se parece
+            game = best_match(game_title, results, key=lambda result: result.get('name', ''),
+                              min_similarity=TITLE_MATCH_MIN_SIMILARITY)
+            if game is None:
+                if results:
+                    logger.debug(f"Ningún resultado de RAWG coincide con {game_title}")
                 return None
             
-            game = results[0]
-            
             return {
                 'rating': game.get('rating', 0.0),
                 'popularity_score': game.get('ratings_count', 0),
@@ -80,38 +252,61 @@ class GameRelevanceEvaluator:
                 'platforms': [platform['platform']['name'] for platform in game.get('platforms', [])]
             }
             
-        except Exception as e:
-            logger.error(f"Error obteniendo datos de RAWG para {game_title}: {e}")
+        except KeyError as e:
+            logger.error(f"Respuesta de RAWG inesperada para {game_title}: {e}")
             return None
     
-    def _get_steam_data(self, game_title: str) -> Optional[Dict]:
-        """Obtiene datos del juego desde Steam (método simplificado)"""
-        try:
-            # Buscar en Steam usando web scraping básico
-            search_url = "https://store.steampowered.com/search/"
-            params = {
-                'term': game_title,
-                'category1': 998  # Juegos
+    def _get_steam_data(self, game_title: str, session: HttpSession) -> Optional[Dict]:
+        """Obtiene datos del juego desde Steam (método simplificado; los errores de red se propagan)"""
+        steam_index = self.steam_index
+        if steam_index is not None:
+            return self._get_steam_data_from_index(steam_index, game_title)
+        if STEAM_INDEX_ENABLED:
+            # Sin índice todavía (o falló la descarga): se reintenta y mientras tanto se busca en la web
+            self._schedule_steam_index_refresh()
+
+        # Buscar en Steam usando web scraping básico
+        search_url = "https://store.steampowered.com/search/"
+        params = {
+            'term': game_title,
+            'category1': 998  # Juegos
+        }
+        
+        response = session.get(search_url, params=params)
+        response.raise_for_status()
+        
+        # Análisis básico del HTML de Steam
+        if "search_result_row" in response.text:
+            # Si encontramos resultados, asignar una puntuación básica
+            return {
+                'rating': 3.5,  # Puntuación promedio
+                'popularity_score': 100,  # Puntuación básica
+                'review_count': 50,
+                'platform': 'Steam'
             }
-            
-            response = self.session.get(search_url, params=params)
-            response.raise_for_status()
-            
-            # Análisis básico del HTML de Steam
-            if "search_result_row" in response.text:
-                # Si encontramos resultados, asignar una puntuación básica
-                return {
-                    'rating': 3.5,  # Puntuación promedio
-                    'popularity_score': 100,  # Puntuación básica
-                    'review_count': 50,
-                    'platform': 'Steam'
-                }
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error obteniendo datos de Steam para {game_title}: {e}")
+        
+        return None
+
+    def _get_steam_data_from_index(self, steam_index, game_title: str) -> Optional[Dict]:
+        """Resuelve el título en el índice local de Steam, sin peticiones de red"""
+        if steam_index.is_stale():
+            self._schedule_steam_index_refresh()
+
+        found = steam_index.find(game_title)
+        metrics.inc('steam_index_lookups_total', result='hit' if found else 'miss')
+        if not found:
             return None
+
+        appid, steam_name = found
+        return {
+            'rating': 3.5,  # Puntuación promedio
+            'popularity_score': 100,  # Puntuación básica
+            'review_count': 50,
+            'platform': 'Steam',
+            # Permite consultar después datos reales de la app por appid
+            'steam_appid': appid,
+            'steam_name': steam_name
+        }
     
     def _basic_relevance_evaluation(self, game_title: str) -> Dict:
         """Evaluación básica de relevancia basada en el título"""
@@ -123,15 +318,9 @@ class GameRelevanceEvaluator:
             'sources': ['Evaluación básica']
         }
         
-        # Palabras clave que indican juegos populares/relevantes
-        popular_keywords = [
-            'AAA', 'indie', 'multiplayer', 'online', 'battle', 'royale',
-            'RPG', 'action', 'adventure', 'strategy', 'simulation',
-            'horror', 'survival', 'racing', 'sports', 'puzzle'
-        ]
-        
-        title_lower = game_title.lower()
-        keyword_matches = sum(1 for keyword in popular_keywords if keyword.lower() in title_lower)
+        # Palabras clave populares y franquicias conocidas (ver keywords.json)
+        matches = get_matcher().find_all(game_title)
+        keyword_matches = len(matches.get('popular', ()))
         
         # Ajustar puntuación basada en palabras clave
         if keyword_matches > 0:
@@ -139,17 +328,9 @@ class GameRelevanceEvaluator:
             relevance_data['popularity_score'] = min(200, 50 + (keyword_matches * 25))
         
         # Juegos con nombres conocidos o franquicias
-        known_franchises = [
-            'assassin', 'call of duty', 'battlefield', 'fifa', 'nba',
-            'grand theft', 'elder scrolls', 'fallout', 'witcher',
-            'minecraft', 'fortnite', 'apex', 'valorant', 'overwatch'
-        ]
-        
-        for franchise in known_franchises:
-            if franchise in title_lower:
-                relevance_data['rating'] = 4.5
-                relevance_data['popularity_score'] = 500
-                break
+        if matches.get('franchises'):
+            relevance_data['rating'] = 4.5
+            relevance_data['popularity_score'] = 500
         
         return relevance_data
     
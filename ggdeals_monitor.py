@@ -1,16 +1,41 @@
 import requests
 import logging
+import heapq
 import json
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
-from config import GGDEALS_API_KEY, GGDEALS_BASE_URL, HEADERS
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from http_client import HttpSession, configure_host
+from json_stream import iter_json_array
+from keyword_matcher import get_matcher
+from titles import canonical_title, fold, has_edition_suffix
+from config import (
+    GGDEALS_API_KEY, GGDEALS_BASE_URL, JSON_STREAM_DECODING,
+    GGDEALS_MAX_CONCURRENCY, GGDEALS_RATE_LIMIT, GGDEALS_MAX_PAGES
+)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ruta de los bundles en la respuesta y campos que lee _filter_high_discount_games
+BUNDLES_PATH = ('data', 'bundles')
+BUNDLE_FIELDS = {
+    'title': None,
+    'url': None,
+    'dateTo': None,
+    'tiers': {
+        'price': None,
+        'currency': None,
+        'gamesCount': None,
+        'games': {'title': None, 'url': None}
+    }
+}
+STREAM_CHUNK_SIZE = 64 * 1024
+
 class GGDealsMonitor:
     def __init__(self):
-        self.session = requests.Session()
+        self.session = HttpSession()
         # Headers específicos para GG.deals API
         ggdeals_headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -22,9 +47,19 @@ class GGDealsMonitor:
         self.session.headers.update(ggdeals_headers)
         self.api_key = GGDEALS_API_KEY
         self.base_url = GGDEALS_BASE_URL
-
-    def get_high_discount_games(self, min_discount_percent: int = 80, max_games: int = 4) -> List[Dict]:
-        """Obtiene juegos con alto descuento desde GG.deals usando la API oficial"""
+        self.max_concurrency = GGDEALS_MAX_CONCURRENCY
+        self.max_pages = GGDEALS_MAX_PAGES
+        # El ritmo y la concurrencia hacia la API los controla el limitador compartido del host
+        configure_host(urlsplit(self.base_url).netloc, GGDEALS_RATE_LIMIT, GGDEALS_MAX_CONCURRENCY)
+        self.bundles_received = 0
+
+    def get_high_discount_games(self, min_discount_percent: int = 80, max_games: int = 4,
+                                should_stop: Optional[Callable[[], bool]] = None) -> List[Dict]:
+        """Obtiene juegos con alto descuento desde GG.deals usando la API oficial.
+
+        Si `should_stop` devuelve True (p. ej. el feed de Epic no ha cambiado y la
+        ejecución termina), no se piden más páginas y se devuelve una lista vacía.
+        """
         if not self.api_key:
             logger.warning("GG.deals API key no configurada")
             return []
@@ -34,24 +69,24 @@ class GGDealsMonitor:
         logger.info(f"Buscando juegos con {min_discount_percent}%+ de descuento en GG.deals...")
 
         try:
-            # Obtener bundles activos usando la API oficial
-            bundles = self._get_active_bundles()
+            # Los bundles de todas las páginas se filtran, puntúan y seleccionan a medida que llegan
+            bundles = self._iter_active_bundles(should_stop or (lambda: False))
+            candidates = self._iter_high_discount_games(bundles, min_discount_percent)
+            # Un juego presente en varios tiers o bundles se une dentro del propio heap
+            result = self._select_top_games(candidates, max_games)
+
+            if should_stop and should_stop():
+                logger.info("⏹️ Lectura de GG.deals cancelada")
+                return []
 
-            if not bundles:
+            if not self.bundles_received:
                 logger.warning("No se pudieron obtener bundles de GG.deals")
                 return []
 
-            # Filtrar y evaluar juegos con alto descuento
-            high_discount_games = self._filter_high_discount_games(bundles, min_discount_percent)
-
-            if not high_discount_games:
+            if not result:
                 logger.info("No se encontraron juegos con descuentos altos en GG.deals")
                 return []
 
-            # Ordenar por calidad/relevancia y limitar cantidad
-            sorted_games = self._sort_games_by_quality(high_discount_games)
-
-            result = sorted_games[:max_games]
             logger.info(f"Se encontraron {len(result)} juegos reales con {min_discount_percent}%+ de descuento")
 
             return result
@@ -64,34 +99,88 @@ class GGDealsMonitor:
 
 
 
-    def _get_active_bundles(self) -> List[Dict]:
-        """Obtiene bundles activos de GG.deals usando la API oficial"""
+    def _iter_active_bundles(self, should_stop: Callable[[], bool]) -> Iterator[Dict]:
+        """Itera los bundles activos de todas las páginas a medida que llegan.
+
+        La primera página da el total; el resto se piden en paralelo (como mucho
+        `max_concurrency` a la vez y respetando el límite del host). Cuando
+        should_stop() devuelve True se cancelan las páginas pendientes. Cada
+        bundle lleva 'position' = (página, índice en la página), para que el
+        desempate no dependa del orden en que responden las páginas.
+        """
+        self.bundles_received = 0
+        if should_stop():
+            return
+        logger.info(f"Obteniendo bundles activos de GG.deals...")
+
+        first_page, total_count = self._get_bundles_page(1)
+        self.bundles_received += len(first_page)
+        yield from self._with_position(first_page, 1)
+
+        page_size = len(first_page)
+        total_pages = math.ceil(total_count / page_size) if page_size else 1
+        if total_pages > self.max_pages:
+            logger.warning(f"GG.deals tiene {total_pages} páginas de bundles; se leen solo {self.max_pages}")
+            total_pages = self.max_pages
+
+        if total_pages > 1:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='ggdeals') as executor:
+                futures = {executor.submit(self._get_bundles_page, page): page
+                           for page in range(2, total_pages + 1)}
+                try:
+                    for future in as_completed(futures):
+                        if should_stop():
+                            return
+                        bundles, _ = future.result()
+                        self.bundles_received += len(bundles)
+                        yield from self._with_position(bundles, futures[future])
+                finally:
+                    # Si el consumidor deja de leer, no se piden más páginas
+                    for future in futures:
+                        future.cancel()
+
+        logger.info(f"Obtenidos {self.bundles_received} bundles de {total_count} totales ({total_pages} páginas)")
+
+    @staticmethod
+    def _with_position(bundles: List[Dict], page: int) -> Iterator[Dict]:
+        for index, bundle in enumerate(bundles):
+            bundle['position'] = (page, index)
+            yield bundle
+
+    def _get_bundles_page(self, page: int) -> Tuple[List[Dict], int]:
+        """Obtiene una página de bundles activos de GG.deals usando la API oficial.
+
+        Devuelve (bundles, totalCount); ([], 0) si la página no se pudo obtener.
+        """
         try:
             url = f"{self.base_url}/bundles/active/"
             params = {
                 'key': self.api_key,
-                'region': 'us'  # Usar región US por defecto
+                'region': 'us',  # Usar región US por defecto
+                'page': page
             }
 
-            logger.info(f"Obteniendo bundles activos de GG.deals...")
-            response = self.session.get(url, params=params, timeout=30)
+            if JSON_STREAM_DECODING:
+                return self._get_bundles_page_stream(url, params)
+
+            response = self.session.get(url, params=params)
             response.raise_for_status()
 
             data = response.json()
-            logger.info(f"API Response success: {data.get('success', False)}")
+            logger.debug(f"API Response success (página {page}): {data.get('success', False)}")
 
             if not data.get('success', False):
                 error_info = data.get('data', {})
                 logger.error(f"GG.deals API error: {error_info}")
-                return []
+                return [], 0
 
             # Extraer bundles según la documentación oficial
             bundles_data = data.get('data', {})
             bundles = bundles_data.get('bundles', [])
             total_count = bundles_data.get('totalCount', 0)
 
-            logger.info(f"Obtenidos {len(bundles)} bundles de {total_count} totales")
-            return bundles
+            logger.debug(f"Página {page}: {len(bundles)} bundles de {total_count} totales")
+            return bundles, total_count
 
         except json.JSONDecodeError as e:
             logger.error(f"Error parsing JSON de GG.deals: {e}")
@@ -99,28 +188,66 @@ class GGDealsMonitor:
             logger.error(f"Response headers: {dict(response.headers)}")
             logger.error(f"Response content: {response.text[:1000]}")
             logger.error(f"Response length: {len(response.content)} bytes")
-            return []
+            return [], 0
         except requests.exceptions.RequestException as e:
             logger.error(f"Error de conexión con GG.deals API: {e}")
-            return []
+            return [], 0
         except Exception as e:
             logger.error(f"Error inesperado obteniendo bundles: {e}")
             if 'response' in locals():
                 logger.error(f"Status code: {getattr(response, 'status_code', 'N/A')}")
                 logger.error(f"Response content: {getattr(response, 'text', 'N/A')[:1000]}")
-            return []
+            return [], 0
 
-    def _filter_high_discount_games(self, bundles: List[Dict], min_discount: int) -> List[Dict]:
-        """Filtra juegos con alto descuento de los bundles"""
-        high_discount_games = []
+    def _get_bundles_page_stream(self, url: str, params: Dict) -> Tuple[List[Dict], int]:
+        """Igual que _get_bundles_page, decodificando la respuesta por trozos.
+
+        Solo se construyen los campos de cada bundle que usa _filter_high_discount_games.
+        """
+        response = self.session.get(url, params=params, stream=True)
+        try:
+            response.raise_for_status()
 
-        for bundle in bundles:
+            meta = {}
+            bundles = list(iter_json_array(
+                response.iter_content(chunk_size=STREAM_CHUNK_SIZE), BUNDLES_PATH, BUNDLE_FIELDS,
+                capture=('success', 'data.totalCount'), meta=meta
+            ))
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing JSON de GG.deals: {e}")
+            logger.error(f"Status code: {response.status_code}")
+            logger.error(f"Response headers: {dict(response.headers)}")
+            return [], 0
+        finally:
+            response.close()
+
+        logger.debug(f"API Response success (página {params['page']}): {meta.get('success', False)}")
+        if not meta.get('success', False):
+            logger.error(f"GG.deals API error (status {response.status_code})")
+            return [], 0
+
+        total_count = meta.get('data.totalCount', 0)
+        logger.debug(f"Página {params['page']}: {len(bundles)} bundles de {total_count} totales")
+        return bundles, total_count
+
+    def _filter_high_discount_games(self, bundles: Iterable[Dict], min_discount: int) -> List[Dict]:
+        """Filtra juegos con alto descuento de los bundles (uno por juego, el más barato)"""
+        return self._dedupe_games(self._iter_high_discount_games(bundles, min_discount))
+
+    def _iter_high_discount_games(self, bundles: Iterable[Dict], min_discount: int) -> Iterator[Dict]:
+        """Itera los juegos con alto descuento de los bundles sin acumularlos.
+
+        'source_order' es la posición del juego en el catálogo (página, bundle,
+        tier, juego); sin 'position' en el bundle se usa el orden de llegada.
+        """
+        for arrival, bundle in enumerate(bundles):
             try:
                 bundle_title = bundle.get('title', '')
                 bundle_url = bundle.get('url', '')
                 date_to = bundle.get('dateTo')
+                position = tuple(bundle.get('position') or (0, arrival))
 
-                for tier in bundle.get('tiers', []):
+                for tier_index, tier in enumerate(bundle.get('tiers', [])):
                     price = float(tier.get('price', '0'))
                     currency = tier.get('currency', 'USD')
                     games = tier.get('games', [])
@@ -139,7 +266,7 @@ class GGDealsMonitor:
                         estimated_discount = self._estimate_discount_by_price(price_per_game)
 
                         if estimated_discount >= min_discount:
-                            for game in games:
+                            for game_index, game in enumerate(games):
                                 game_info = {
                                     'title': game.get('title', 'Sin título'),
                                     'url': game.get('url', ''),
@@ -151,15 +278,100 @@ class GGDealsMonitor:
                                     'estimated_discount': round(estimated_discount, 1),
                                     'games_in_tier': len(games),
                                     'end_date': date_to,
+                                    'source_order': position + (tier_index, game_index),
                                     'extracted_at': datetime.now(timezone.utc).isoformat()
                                 }
-                                high_discount_games.append(game_info)
+                                yield game_info
 
             except Exception as e:
                 logger.error(f"Error procesando bundle: {e}")
                 continue
 
-        return high_discount_games
+    @staticmethod
+    def _deal_key(game: Dict) -> str:
+        """Identifica un juego entre bundles: su URL de GG.deals, o el título plegado si no la tiene"""
+        return game.get('url') or 'title:' + fold(game.get('title') or '')
+
+    def _edition_key(self, game: Dict, key: str, editions: Dict[str, Tuple[str, bool]]) -> str:
+        """Clave con la que se une el juego: la suya o, si es una edición conocida de otro, la de ese.
+
+        Las ediciones ('GOTY Edition', '- Deluxe'...) tienen otra URL en GG.deals pero
+        son el mismo juego a efectos de la oferta. Solo se unen dos URLs con el mismo
+        título canónico si una de ellas lleva sufijo de edición; dos títulos sin
+        sufijo que coinciden al normalizarse siguen siendo juegos distintos.
+        `editions` guarda título canónico -> (clave, lleva sufijo) del primero visto.
+        """
+        title = game.get('title') or ''
+        canonical = canonical_title(title)
+        if not canonical:
+            return key
+        is_edition = has_edition_suffix(title)
+        known = editions.get(canonical)
+        if known is None:
+            editions[canonical] = (key, is_edition)
+            return key
+        known_key, known_is_edition = known
+        if known_key != key and (is_edition or known_is_edition):
+            return known_key
+        return key
+
+    def _dedupe_games(self, games: Iterable[Dict]) -> List[Dict]:
+        """Une las apariciones del mismo juego en varios tiers o bundles.
+
+        Se conserva la de menor price_per_game y los demás bundles quedan en
+        'alternatives' (uno por bundle, ordenados por precio). El orden de
+        llegada de cada juego se mantiene.
+        """
+        best: Dict[str, Dict] = {}
+        editions: Dict[str, Tuple[str, bool]] = {}
+
+        for game in games:
+            key = self._deal_key(game)
+            if key not in best:
+                key = self._edition_key(game, key, editions)
+            current = best.get(key)
+            if current is None:
+                game['alternatives'] = []
+                best[key] = game
+            else:
+                best[key] = self._merge_deal(current, game)
+
+        for game in best.values():
+            game['alternatives'].sort(key=lambda alternative: alternative['price_per_game'])
+
+        duplicates = sum(len(game['alternatives']) for game in best.values())
+        if duplicates:
+            logger.info(f"{len(best)} juegos únicos; {duplicates} ofertas repetidas en otros bundles")
+        return list(best.values())
+
+    def _merge_deal(self, current: Dict, game: Dict) -> Dict:
+        """Une otra aparición de `current`; devuelve la de menor price_per_game con la otra como alternativa"""
+        if game['price_per_game'] < current['price_per_game']:
+            game['alternatives'] = [alternative for alternative in current.pop('alternatives')
+                                    if not self._same_bundle(alternative, game)]
+            self._add_alternative(game, current)
+            return game
+        self._add_alternative(current, game)
+        return current
+
+    @staticmethod
+    def _same_bundle(a: Dict, b: Dict) -> bool:
+        return a.get('bundle_url') == b.get('bundle_url') and a.get('bundle_title') == b.get('bundle_title')
+
+    def _add_alternative(self, game: Dict, other: Dict):
+        """Registra `other` como bundle alternativo de `game` (el más barato por bundle)"""
+        if self._same_bundle(other, game):
+            return
+
+        alternative = {key: other.get(key) for key in
+                       ('bundle_title', 'bundle_url', 'price_per_game', 'currency', 'end_date')}
+        alternatives = game['alternatives']
+        for i, existing in enumerate(alternatives):
+            if self._same_bundle(existing, alternative):
+                if alternative['price_per_game'] < existing['price_per_game']:
+                    alternatives[i] = alternative
+                return
+        alternatives.append(alternative)
 
     def _estimate_discount_by_price(self, price_per_game: float) -> float:
         """Estima el porcentaje de descuento basado en el precio por juego"""
@@ -177,50 +389,97 @@ class GGDealsMonitor:
         else:
             return 70.0  # Precio alto, descuento menor
 
+    def _quality_score(self, game: Dict, matcher=None) -> int:
+        """Puntuación de calidad/relevancia de una oferta"""
+        matcher = matcher or get_matcher()
+        score = 0
+        # Ediciones de calidad y franquicias conocidas (ver keywords.json)
+        matches = matcher.find_all(game.get('title', ''))
+        score += 10 * len(matches.get('quality', ()))
+        score += 20 * len(matches.get('franchises', ()))
+
+        discount = game.get('estimated_discount', 0)
+        if discount >= 90:
+            score += 15
+        elif discount >= 85:
+            score += 10
+        elif discount >= 80:
+            score += 5
+
+        price_per_game = game.get('price_per_game', 0)
+        if price_per_game > 10:
+            score -= 5
+        elif price_per_game > 5:
+            score -= 2
+
+        return score
+
     def _sort_games_by_quality(self, games: List[Dict]) -> List[Dict]:
         """Ordena juegos por calidad/relevancia"""
-        def quality_score(game):
-            score = 0
-            title = game.get('title', '').lower()
-
-            quality_keywords = [
-                'goty', 'edition', 'deluxe', 'ultimate', 'complete', 'definitive',
-                'remastered', 'enhanced', 'director', 'special', 'premium'
-            ]
-
-            for keyword in quality_keywords:
-                if keyword in title:
-                    score += 10
-
-            known_franchises = [
-                'assassin', 'call of duty', 'battlefield', 'fifa', 'nba',
-                'grand theft', 'elder scrolls', 'fallout', 'witcher',
-                'tomb raider', 'far cry', 'bioshock', 'borderlands',
-                'civilization', 'total war', 'dark souls', 'sekiro',
-                'resident evil', 'final fantasy', 'metal gear'
-            ]
-
-            for franchise in known_franchises:
-                if franchise in title:
-                    score += 20
-
-            discount = game.get('estimated_discount', 0)
-            if discount >= 90:
-                score += 15
-            elif discount >= 85:
-                score += 10
-            elif discount >= 80:
-                score += 5
-
-            price_per_game = game.get('price_per_game', 0)
-            if price_per_game > 10:
-                score -= 5
-            elif price_per_game > 5:
-                score -= 2
+        matcher = get_matcher()
+        return sorted(games, key=lambda game: self._quality_score(game, matcher), reverse=True)
+
+    def _select_top_games(self, games: Iterable[Dict], k: int) -> List[Dict]:
+        """Selecciona los k mejores juegos distintos con un heap acotado.
+
+        Las apariciones repetidas de un juego (misma URL o edición conocida, ver
+        _edition_key) se unen en el propio heap: cada clave apunta a su entrada,
+        que guarda la oferta más barata y las demás como alternativas. Un juego
+        se ordena por su mejor aparición (puntuación y, a igualdad, la que está
+        antes en el catálogo según 'source_order', no la que antes llegó por red),
+        así que una copia peor de un juego que ya salió del heap tampoco entra:
+        solo se recuerdan los k juegos del heap y la memoria es O(k) aunque el
+        catálogo tenga miles de juegos.
+        """
+        if k <= 0:
+            return []
 
-            return score
+        matcher = get_matcher()
+        heap = []  # [puntuación, posición invertida, clave, juego]; la raíz es el peor
+        slots: Dict[str, list] = {}  # clave -> su entrada del heap
+        editions: Dict[str, Tuple[str, bool]] = {}  # solo de los juegos del heap
+        merged = 0
+
+        for arrival, game in enumerate(games):
+            key = self._deal_key(game)
+            if key not in slots:
+                key = self._edition_key(game, key, editions)
+            rank = [self._quality_score(game, matcher),
+                    tuple(-index for index in game.get('source_order', (arrival,)))]
+
+            entry = slots.get(key)
+            if entry is not None:
+                merged += 1
+                entry[3] = self._merge_deal(entry[3], game)
+                if rank > entry[:2]:
+                    entry[:2] = rank
+                    heapq.heapify(heap)
+                continue
 
-        return sorted(games, key=quality_score, reverse=True)
+            game['alternatives'] = []
+            entry = rank + [key, game]
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                evicted = heapq.heapreplace(heap, entry)
+                del slots[evicted[2]]
+                self._forget_edition(evicted[2], editions)
+            else:
+                self._forget_edition(key, editions)
+                continue
+            slots[key] = entry
+
+        for entry in heap:
+            entry[3]['alternatives'].sort(key=lambda alternative: alternative['price_per_game'])
+        if merged:
+            logger.info(f"{merged} ofertas repetidas unidas a otros bundles")
+        return [entry[3] for entry in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
+
+    @staticmethod
+    def _forget_edition(key: str, editions: Dict[str, Tuple[str, bool]]):
+        """Olvida los títulos canónicos que apuntan a `key` (ya no está en el heap)"""
+        for canonical in [canonical for canonical, (known_key, _) in editions.items() if known_key == key]:
+            del editions[canonical]
 
     def _format_date(self, date_str: str) -> str:
         """Formatea una fecha para mostrar"""
@@ -0,0 +1,410 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, HTTP_POOL_MAXSIZE, HTTP_RECORD_DIR, HTTP_REPLAY_URL,
+    HTTP_HOST_RATE_LIMIT, HTTP_HOST_MAX_CONCURRENCY, HTTP_HOST_LIMITS, HTTP_LATENCY_TOLERANCE, HTTP_RETRY_AFTER_MAX
+)
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Códigos que justifican reintentar una petición idempotente
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Se agotó el presupuesto de tiempo de la ejecución"""
+
+
+class Deadline:
+    """Presupuesto de tiempo de una ejecución completa"""
+
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.started_at = time.monotonic()
+
+    def remaining(self) -> Optional[float]:
+        """Segundos restantes, o None si no hay límite"""
+        if self.seconds is None:
+            return None
+        return max(0.0, self.seconds - (time.monotonic() - self.started_at))
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+class TokenBucket:
+    """Cubo de tokens: ráfagas de hasta `burst` peticiones y después `rate` por segundo (0 = sin límite)"""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, deadline: Optional[Deadline] = None):
+        """Bloquea hasta que haya un token. Los turnos se reservan en orden de llegada"""
+        with self._lock:
+            if self.rate <= 0:
+                return
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            remaining = deadline.remaining() if deadline else None
+            if remaining is not None and remaining <= wait:
+                raise DeadlineExceeded("Presupuesto de tiempo agotado esperando turno de petición")
+            # Sin tokens el saldo queda en negativo: las siguientes esperan su turno detrás
+            self._tokens -= 1
+
+        if wait:
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """Límite adaptativo de peticiones a un host, compartido por todas las sesiones del proceso.
+
+    Combina un cubo de tokens (ritmo) con un límite de peticiones simultáneas que
+    se ajusta con AIMD: cada respuesta correcta lo sube en 1/límite (un punto por
+    cada "ventana" completa) y un 429, un 5xx, un error de red o una latencia que
+    supere `latency_tolerance` veces la habitual lo reducen a la mitad, como
+    mucho una vez por ventana para que una ráfaga de rechazos no lo hunda. Ante
+    un 429/503 también se reduce el ritmo, y con Retry-After el host queda en
+    pausa hasta la fecha indicada. Los límites vigentes se publican como gauges.
+    """
+
+    # Peso de cada respuesta en la media móvil de latencia, respuestas necesarias
+    # antes de juzgarla y margen absoluto para no reaccionar al ruido de hosts muy rápidos
+    LATENCY_ALPHA = 0.3
+    LATENCY_MIN_SAMPLES = 5
+    LATENCY_SLACK_SECONDS = 0.1
+    # Velocidad a la que la latencia de referencia sigue a la media si esta sube
+    BASELINE_DRIFT = 0.02
+    # Fracción del ritmo máximo que se recupera con cada respuesta correcta, y suelo tras reducirlo
+    RATE_STEP = 0.05
+    RATE_FLOOR = 0.05
+
+    def __init__(self, host: str, rate: float = HTTP_HOST_RATE_LIMIT,
+                 max_concurrency: int = HTTP_HOST_MAX_CONCURRENCY,
+                 latency_tolerance: float = HTTP_LATENCY_TOLERANCE,
+                 retry_after_max: float = HTTP_RETRY_AFTER_MAX):
+        self.host = host
+        self.latency_tolerance = latency_tolerance
+        self.retry_after_max = retry_after_max
+        self.max_rate = 0.0
+        self.max_concurrency = 1
+        self.concurrency = 1.0
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.bucket = TokenBucket(0)
+        self._latency: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._samples = 0
+        self._decreased_at = 0.0
+        self._cond = threading.Condition()
+        self.configure(rate, max_concurrency)
+
+    def configure(self, rate: float, max_concurrency: int):
+        """Fija los límites máximos (y de partida) del host"""
+        with self._cond:
+            self.max_rate = max(0.0, rate)
+            self.max_concurrency = max(1, max_concurrency)
+            self.concurrency = float(self.max_concurrency)
+            # Ráfaga de hasta un segundo de peticiones
+            self.bucket.burst = max(1.0, self.max_rate)
+            self.bucket.set_rate(self.max_rate)
+            self._publish()
+            self._cond.notify_all()
+
+    def acquire(self, deadline: Optional[Deadline] = None):
+        """Bloquea hasta que haya hueco (pausa, concurrencia y ritmo); después, complete o release"""
+        started_at = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                paused = self.paused_until - now
+                if paused <= 0 and self.in_flight < int(self.concurrency):
+                    break
+                remaining = deadline.remaining() if deadline else None
+                if remaining is not None and remaining <= max(paused, 0.0):
+                    raise DeadlineExceeded(f"Presupuesto de tiempo agotado esperando turno en {self.host}")
+                timeout = paused if paused > 0 else None
+                if remaining is not None:
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                self._cond.wait(timeout)
+            self.in_flight += 1
+            in_flight = self.in_flight
+
+        try:
+            self.bucket.acquire(deadline)
+        except DeadlineExceeded:
+            self.release()
+            raise
+
+        metrics.set_gauge('http_host_in_flight', in_flight, host=self.host)
+        waited = time.monotonic() - started_at
+        if waited >= 0.001:
+            metrics.observe('http_limiter_wait_seconds', waited, host=self.host)
+
+    def complete(self, status: Optional[int], elapsed: float, retry_after: Optional[float] = None):
+        """Libera el hueco y ajusta los límites según el resultado (status None = error de red)"""
+        with self._cond:
+            now = time.monotonic()
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + min(retry_after, self.retry_after_max))
+                metrics.inc('http_throttled_total', host=self.host, reason='retry_after')
+
+            if status in (429, 503):
+                self._decrease(now, 'throttled', slow_down=True)
+            elif status is None or status >= 500:
+                self._decrease(now, 'error')
+            elif self._congested(elapsed):
+                self._decrease(now, 'latency')
+            elif status < 500:
+                self._increase()
+        self.release()
+
+    def release(self):
+        """Libera el hueco sin ajustar los límites (la petición no llegó a enviarse)"""
+        with self._cond:
+            self.in_flight -= 1
+            metrics.set_gauge('http_host_in_flight', self.in_flight, host=self.host)
+            self._cond.notify_all()
+
+    def _congested(self, elapsed: float) -> bool:
+        """Actualiza la latencia media y la de referencia; True si la media se ha disparado"""
+        if self._latency is None:
+            self._latency = self._baseline = elapsed
+        else:
+            self._latency += self.LATENCY_ALPHA * (elapsed - self._latency)
+            if self._latency < self._baseline:
+                self._baseline = self._latency
+            else:
+                self._baseline += self.BASELINE_DRIFT * (self._latency - self._baseline)
+        self._samples += 1
+        return (self._samples >= self.LATENCY_MIN_SAMPLES
+                and self._latency > self._baseline * self.latency_tolerance
+                and self._latency - self._baseline > self.LATENCY_SLACK_SECONDS)
+
+    def _increase(self):
+        changed = False
+        if self.concurrency < self.max_concurrency:
+            self.concurrency = min(float(self.max_concurrency), self.concurrency + 1 / self.concurrency)
+            changed = True
+        if self.max_rate and self.bucket.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate * self.RATE_STEP))
+            changed = True
+        if changed:
+            self._publish()
+
+    def _decrease(self, now: float, reason: str, slow_down: bool = False):
+        metrics.inc('http_throttled_total', host=self.host, reason=reason)
+        # Una reducción por ventana: las respuestas que ya estaban en vuelo no cuentan dos veces
+        window = max(self._latency or 0.0, 1.0)
+        if now - self._decreased_at < window:
+            return
+        self._decreased_at = now
+        self.concurrency = max(1.0, self.concurrency / 2)
+        if slow_down and self.max_rate:
+            self.bucket.set_rate(max(self.max_rate * self.RATE_FLOOR, self.bucket.rate / 2))
+        # Tras un cambio de régimen la latencia de referencia se vuelve a aprender
+        self._baseline = self._latency
+        self._publish()
+        logger.info(f"🚦 {self.host}: límite reducido ({reason}) a {int(self.concurrency)} simultáneas"
+                    + (f" y {self.bucket.rate:.2f} peticiones/s" if self.max_rate else ""))
+
+    def _publish(self):
+        metrics.set_gauge('http_host_concurrency_limit', round(self.concurrency, 2), host=self.host)
+        metrics.set_gauge('http_host_rate_limit', round(self.bucket.rate, 3), host=self.host)
+
+
+def parse_host_limits(value: str) -> Dict[str, Tuple[float, int]]:
+    """Convierte "api.rawg.io=5:4,store.steampowered.com=4:4" en {host: (ritmo, concurrencia)}"""
+    limits = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        host, _, spec = item.partition('=')
+        rate, _, concurrency = spec.partition(':')
+        try:
+            limits[host.strip().lower()] = (float(rate or HTTP_HOST_RATE_LIMIT),
+                                            int(concurrency or HTTP_HOST_MAX_CONCURRENCY))
+        except ValueError:
+            logger.warning(f"Límite de host no válido en HTTP_HOST_LIMITS: {item.strip()!r}")
+    return limits
+
+
+# Un limitador por host para todo el proceso, lo use la sesión que lo use
+_host_limits = parse_host_limits(HTTP_HOST_LIMITS)
+_host_limiters: Dict[str, HostLimiter] = {}
+_host_limiters_lock = threading.Lock()
+
+
+def host_limiter(host: str) -> HostLimiter:
+    """Limitador compartido del host (host[:puerto])"""
+    host = host.lower()
+    with _host_limiters_lock:
+        limiter = _host_limiters.get(host)
+        if limiter is None:
+            rate, concurrency = _host_limits.get(host, (HTTP_HOST_RATE_LIMIT, HTTP_HOST_MAX_CONCURRENCY))
+            limiter = _host_limiters[host] = HostLimiter(host, rate, concurrency)
+        return limiter
+
+
+def configure_host(host: str, rate: float, max_concurrency: int):
+    """Fija los límites de un host, salvo que HTTP_HOST_LIMITS ya los defina.
+
+    Si no cambian no se toca el limitador, que conserva lo aprendido en ciclos anteriores.
+    """
+    host = host.lower()
+    if host in _host_limits:
+        return
+    limiter = host_limiter(host)
+    if (limiter.max_rate, limiter.max_concurrency) != (max(0.0, rate), max(1, max_concurrency)):
+        limiter.configure(rate, max_concurrency)
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Segundos indicados en Retry-After (número o fecha HTTP), o None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class HttpSession(requests.Session):
+    """Sesión con timeouts por defecto, reintentos con backoff y deadline por ejecución"""
+
+    def __init__(self, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_retries: int = HTTP_MAX_RETRIES):
+        super().__init__()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.deadline: Optional[Deadline] = None
+
+        adapter = self._make_adapter()
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    @staticmethod
+    def _make_adapter() -> HTTPAdapter:
+        """Adaptador con pool de conexiones; en modo grabación/reproducción, el de replay.py"""
+        pool = {'pool_connections': HTTP_POOL_MAXSIZE, 'pool_maxsize': HTTP_POOL_MAXSIZE}
+        if HTTP_REPLAY_URL:
+            from replay import ReplayAdapter
+            return ReplayAdapter(HTTP_REPLAY_URL, **pool)
+        if HTTP_RECORD_DIR:
+            from replay import RecordingAdapter
+            return RecordingAdapter(HTTP_RECORD_DIR, **pool)
+        return HTTPAdapter(**pool)
+
+    def request(self, method, url, **kwargs):
+        retries = self.max_retries if method.upper() in IDEMPOTENT_METHODS else 0
+        requested_timeout = kwargs.pop('timeout', None)
+
+        host = urlsplit(url).netloc
+        limiter = host_limiter(host)
+
+        for attempt in range(retries + 1):
+            limiter.acquire(self.deadline)
+            # El timeout se calcula tras la espera del limitador, que consume presupuesto
+            try:
+                kwargs['timeout'] = self._effective_timeout(requested_timeout, url)
+            except DeadlineExceeded:
+                limiter.release()
+                raise
+
+            started_at = time.perf_counter()
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                elapsed = time.perf_counter() - started_at
+                limiter.complete(None, elapsed)
+                metrics.observe('http_request_duration_seconds', elapsed, host=host)
+                metrics.inc('http_errors_total', host=host, error=type(e).__name__)
+                if attempt >= retries:
+                    raise
+                logger.warning(f"Error de red en {url} (intento {attempt + 1}/{retries + 1}): {e}")
+            except BaseException:
+                limiter.release()
+                raise
+            else:
+                elapsed = time.perf_counter() - started_at
+                # En streaming el hueco se libera al recibir las cabeceras, no al leer el cuerpo
+                limiter.complete(response.status_code, elapsed,
+                                retry_after_seconds(response) if response.status_code in (429, 503) else None)
+                self._record_response(host, response, elapsed, kwargs.get('stream'))
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+                logger.warning(f"HTTP {response.status_code} en {url} (intento {attempt + 1}/{retries + 1})")
+                response.close()
+
+            metrics.inc('http_retries_total', host=host)
+            self._backoff(attempt, url)
+
+    @staticmethod
+    def _record_response(host: str, response: requests.Response, elapsed: float, stream: bool):
+        """Registra duración, código y bytes de una respuesta"""
+        metrics.observe('http_request_duration_seconds', elapsed, host=host)
+        metrics.inc('http_requests_total', host=host, status=response.status_code)
+        # En streaming el cuerpo aún no se ha leído: se usa Content-Length si viene
+        if stream:
+            size = int(response.headers.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        metrics.inc('http_response_bytes_total', size, host=host)
+
+    def _effective_timeout(self, requested_timeout, url: str):
+        """Calcula (connect, read) limitados por el tiempo restante de la ejecución"""
+        if requested_timeout is None:
+            connect, read = self.connect_timeout, self.read_timeout
+        elif isinstance(requested_timeout, tuple):
+            connect, read = requested_timeout
+        else:
+            connect = read = requested_timeout
+
+        remaining = self.deadline.remaining() if self.deadline else None
+        if remaining is None:
+            return (connect, read)
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Presupuesto de tiempo agotado antes de solicitar {url}")
+        return (min(connect, remaining), min(read, remaining))
+
+    def _backoff(self, attempt: int, url: str):
+        """Espera con backoff exponencial y jitter completo antes de reintentar"""
+        delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+        remaining = self.deadline.remaining() if self.deadline else None
+        if remaining is not None and remaining <= delay:
+            raise DeadlineExceeded(f"Presupuesto de tiempo agotado reintentando {url}")
+
+        time.sleep(delay)
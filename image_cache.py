@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, Optional, Tuple
+from http_client import HttpSession
+from config import (
+    IMAGE_CACHE_DIR, IMAGE_MAX_WIDTH, IMAGE_JPEG_QUALITY, IMAGE_MAX_INLINE_BYTES,
+    IMAGE_PREFETCH_WORKERS, IMAGE_CACHE_MAX_AGE_DAYS
+)
+
+logger = logging.getLogger(__name__)
+
+# Subtipos MIME que se guardan en caché; la extensión del archivo es el subtipo
+IMAGE_SUBTYPES = ('jpeg', 'png', 'gif', 'webp')
+SUBTYPE_ALIASES = {'jpg': 'jpeg', 'pjpeg': 'jpeg'}
+
+
+def url_key(url: str) -> str:
+    """Clave de caché de una URL de imagen"""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+class InlineImage:
+    """Imagen lista para adjuntarse al correo como parte inline (referenciada con cid:)"""
+
+    def __init__(self, url: str, data: bytes, subtype: str):
+        self.url = url
+        self.data = data
+        self.subtype = subtype
+        # Determinista: el mismo asset tiene el mismo Content-ID en todos los correos
+        self.cid = f"{url_key(url)[:24]}@epic-monitor"
+
+    @property
+    def filename(self) -> str:
+        return f"{self.cid.split('@', 1)[0]}.{'jpg' if self.subtype == 'jpeg' else self.subtype}"
+
+
+class ImageCache:
+    """Caché en disco de imágenes de juegos ya reducidas para el correo, indexada por URL.
+
+    Una URL solo se descarga la primera vez que aparece; si Epic cambia la imagen
+    de un juego, cambia la URL y se descarga la nueva. Las entradas que no se usan
+    en IMAGE_CACHE_MAX_AGE_DAYS días se eliminan.
+    """
+
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_width: int = IMAGE_MAX_WIDTH,
+                 quality: int = IMAGE_JPEG_QUALITY, max_inline_bytes: int = IMAGE_MAX_INLINE_BYTES,
+                 max_workers: int = IMAGE_PREFETCH_WORKERS, max_age_days: float = IMAGE_CACHE_MAX_AGE_DAYS):
+        self.directory = directory
+        self.max_width = max_width
+        self.quality = quality
+        self.max_inline_bytes = max_inline_bytes
+        self.max_workers = max(1, max_workers)
+        self.max_age = max_age_days * 86400
+        self.session = HttpSession()
+        self.hits = 0
+        self.downloads = 0
+        self._pillow_warned = False
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def prefetch(self, urls: Iterable[Optional[str]]) -> Dict[str, InlineImage]:
+        """Carga (de disco o descargando en paralelo) las imágenes. Devuelve {url: imagen} de las incrustables"""
+        pending = [url for url in dict.fromkeys(urls) if url]
+        if not pending:
+            return {}
+
+        self.hits = self.downloads = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)),
+                                thread_name_prefix='image') as executor:
+            loaded = dict(zip(pending, executor.map(self._load, pending)))
+
+        images = {url: image for url, image in loaded.items() if image is not None}
+        logger.info(f"🖼️ Imágenes: {len(images)}/{len(pending)} incrustadas "
+                    f"({self.hits} en caché, {self.downloads} descargadas)")
+        self.prune()
+        return images
+
+    def _load(self, url: str) -> Optional[InlineImage]:
+        try:
+            cached = self._cached_file(url)
+            if cached:
+                path, subtype = cached
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # La fecha de modificación marca el último uso (para prune)
+                os.utime(path)
+                with self._lock:
+                    self.hits += 1
+            else:
+                data, subtype = self._download(url)
+                if subtype is None:
+                    return None
+                self._store(url, data, subtype)
+        except Exception as e:
+            logger.warning(f"No se pudo obtener la imagen {url}: {e}")
+            return None
+
+        if len(data) > self.max_inline_bytes:
+            logger.debug(f"Imagen demasiado grande para incrustar ({len(data)} bytes): {url}")
+            return None
+        return InlineImage(url, data, subtype)
+
+    def _cached_file(self, url: str) -> Optional[Tuple[str, str]]:
+        key = url_key(url)
+        for subtype in IMAGE_SUBTYPES:
+            path = os.path.join(self.directory, f"{key}.{subtype}")
+            if os.path.exists(path):
+                return path, subtype
+        return None
+
+    def _store(self, url: str, data: bytes, subtype: str):
+        """Guarda la imagen de forma atómica"""
+        path = os.path.join(self.directory, f"{url_key(url)}.{subtype}")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _download(self, url: str) -> Tuple[bytes, Optional[str]]:
+        response = self.session.get(url)
+        response.raise_for_status()
+        with self._lock:
+            self.downloads += 1
+
+        content_type = response.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        maintype, _, subtype = content_type.partition('/')
+        subtype = SUBTYPE_ALIASES.get(subtype, subtype)
+        if maintype != 'image':
+            logger.warning(f"La URL no devolvió una imagen ({content_type or 'sin Content-Type'}): {url}")
+            return b'', None
+        return self._downscale(response.content, subtype)
+
+    def _downscale(self, data: bytes, subtype: str) -> Tuple[bytes, Optional[str]]:
+        """Reduce la imagen al ancho del correo y la recomprime (JPEG, o PNG si tiene transparencia)"""
+        try:
+            from PIL import Image
+        except ImportError:
+            with self._lock:
+                if not self._pillow_warned:
+                    logger.warning("Pillow no está instalado: las imágenes se incrustan sin reducir")
+                    self._pillow_warned = True
+            return data, subtype if subtype in IMAGE_SUBTYPES else None
+
+        with Image.open(BytesIO(data)) as image:
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            if image.width <= self.max_width and subtype in IMAGE_SUBTYPES and len(data) <= self.max_inline_bytes:
+                return data, subtype
+
+            if image.width > self.max_width:
+                height = max(1, round(image.height * self.max_width / image.width))
+                image = image.resize((self.max_width, height), Image.LANCZOS)
+
+            output = BytesIO()
+            if has_alpha:
+                image.convert('RGBA').save(output, 'PNG', optimize=True)
+                return output.getvalue(), 'png'
+            image.convert('RGB').save(output, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+            return output.getvalue(), 'jpeg'
+
+    def prune(self):
+        """Elimina las imágenes que no se han usado en max_age segundos"""
+        if self.max_age <= 0:
+            return
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"🧹 {removed} imágenes sin uso eliminadas de la caché")
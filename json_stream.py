@@ -0,0 +1,167 @@
+import codecs
+import json
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+
+# Decodificador JSON en streaming y selectivo.
+#
+# Recorre la respuesta por trozos y baja solo por la ruta pedida (por ejemplo
+# data.bundles). Cada elemento del array se decodifica por separado y se reduce
+# a los campos de la proyección antes de pasar al siguiente, de modo que nunca
+# está en memoria más de un elemento completo ni el documento entero.
+
+WHITESPACE = ' \t\n\r'
+NUMBER_CHARS = '0123456789+-.eE'
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Buffer de texto que se rellena bajo demanda desde un iterable de bytes"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Añade el siguiente trozo descartando el texto ya consumido"""
+        if self.eof:
+            return False
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self.buf = self.buf[self.pos:] + text
+                self.pos = 0
+                return True
+        self.buf = self.buf[self.pos:] + self._decoder.decode(b'', final=True)
+        self.pos = 0
+        self.eof = True
+        return False
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buf, self.pos)
+
+    def peek(self) -> str:
+        """Siguiente carácter significativo ('' al final del documento)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise self.error(f"Se esperaba '{char}'")
+        self.pos += 1
+
+    def read_value(self):
+        """Decodifica el valor en pos, leyendo más trozos mientras esté incompleto.
+
+        Tras un intento fallido se espera a que el texto pendiente se duplique
+        antes de reintentar, para que los valores grandes no se decodifiquen
+        una vez por trozo.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # Un número al final del buffer puede continuar en el siguiente trozo
+                if self.eof or (end < len(self.buf) and self.buf[end] not in NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            pending = len(self.buf) - self.pos
+            while len(self.buf) - self.pos < 2 * pending and self.fill():
+                pass
+
+    def skip_value(self):
+        """Salta el valor en pos"""
+        self.read_value()
+
+    def read_key(self) -> str:
+        key = self.read_value()
+        if not isinstance(key, str):
+            raise self.error("Se esperaba una clave de objeto")
+        self.expect(':')
+        return key
+
+    def next_member(self, closing: str) -> bool:
+        """Consume ',' entre miembros; devuelve False al cerrar el contenedor"""
+        char = self.peek()
+        if char == ',':
+            self.pos += 1
+            return True
+        if char == closing:
+            self.pos += 1
+            return False
+        raise self.error(f"Se esperaba ',' o '{closing}'")
+
+
+def project(value, fields: Optional[Dict]):
+    """Conserva de un valor decodificado solo los campos de la proyección.
+
+    `fields` es None (valor completo) o {clave: subproyección}; sobre una lista
+    la proyección se aplica a cada elemento.
+    """
+    if fields is None:
+        return value
+    if isinstance(value, dict):
+        return {key: project(value[key], sub) for key, sub in fields.items() if key in value}
+    if isinstance(value, list):
+        return [project(item, fields) for item in value]
+    return value
+
+
+def _walk(reader: _Reader, path: Sequence[str], prefix: str, fields: Optional[Dict],
+          capture: Sequence[str], meta: Dict) -> Iterator:
+    if not path:
+        if reader.peek() != '[':
+            reader.skip_value()
+            return
+        reader.pos += 1
+        if reader.peek() == ']':
+            reader.pos += 1
+            return
+        while True:
+            yield project(reader.read_value(), fields)
+            if not reader.next_member(']'):
+                return
+
+    if reader.peek() != '{':
+        reader.skip_value()
+        return
+    reader.pos += 1
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+    while True:
+        key = reader.read_key()
+        dotted = f"{prefix}.{key}" if prefix else key
+        if key == path[0]:
+            yield from _walk(reader, path[1:], dotted, fields, capture, meta)
+        elif dotted in capture:
+            meta[dotted] = reader.read_value()
+        else:
+            reader.skip_value()
+        if not reader.next_member('}'):
+            return
+
+
+def iter_json_array(chunks: Iterable[bytes], path: Sequence[str], fields: Optional[Dict] = None,
+                    capture: Sequence[str] = (), meta: Optional[Dict] = None) -> Iterator:
+    """Itera los elementos del array en `path` de un documento JSON recibido por trozos.
+
+    Cada elemento se construye solo con los campos de `fields`. Los valores cuyas
+    rutas (con puntos, p. ej. 'data.totalCount') estén en `capture` se guardan en
+    `meta`; los que aparecen después del array están disponibles al agotar el iterador.
+    """
+    reader = _Reader(chunks)
+    if meta is None:
+        meta = {}
+    yield from _walk(reader, tuple(path), '', fields, tuple(capture), meta)
@@ -0,0 +1,76 @@
+import json
+import logging
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Set, Tuple
+from config import KEYWORDS_FILE
+
+logger = logging.getLogger(__name__)
+
+class KeywordMatcher:
+    """Autómata Aho-Corasick sobre varias tablas de palabras clave.
+
+    Encuentra en una sola pasada por el título todas las palabras de todas las
+    tablas (también solapadas, como 'battle' dentro de 'battlefield'), con la
+    misma semántica de subcadena sin distinguir mayúsculas que el antiguo
+    `keyword in title.lower()`.
+    """
+
+    def __init__(self, tables: Dict[str, List[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+
+        for category, words in tables.items():
+            for word in words:
+                self._add(word.lower(), category)
+        self._build_failure_links()
+
+    def _add(self, word: str, category: str):
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append((category, word))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> Dict[str, Set[str]]:
+        """Devuelve {tabla: palabras encontradas} para el texto"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found: Dict[str, Set[str]] = {}
+        state = 0
+
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for category, word in output[state]:
+                found.setdefault(category, set()).add(word)
+
+        return found
+
+
+@lru_cache(maxsize=None)
+def get_matcher(path: str = KEYWORDS_FILE) -> KeywordMatcher:
+    """Carga las tablas de palabras clave y compila el autómata una sola vez por proceso"""
+    with open(path, 'r', encoding='utf-8') as f:
+        tables = json.load(f)
+    logger.debug(f"Tablas de palabras clave cargadas desde {path}: {', '.join(tables)}")
+    return KeywordMatcher(tables)
@@ -5,176 +5,346 @@ Monitorea automáticamente los juegos gratuitos de Epic Games Store
 y envía notificaciones por correo cuando hay nuevos juegos disponibles.
 """
 
-import json
+import argparse
 import logging
-import os
 import sys
-from datetime import datetime, timezone
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Optional
 
-from epic_games_monitor import EpicGamesMonitor
-from email_sender import EmailSender
-from game_relevance import GameRelevanceEvaluator
-from ggdeals_monitor import GGDealsMonitor
-from config import DATABASE_FILE, MAX_GAMES_TO_PROCESS
-
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('epic_games_monitor.log', encoding='utf-8')
-    ]
-)
+from pipeline import StageGraph
+
+# Los módulos de cada etapa (y config, que lee el entorno) se importan de forma
+# diferida para que importar main no tenga efectos secundarios ni coste de arranque
 logger = logging.getLogger(__name__)
 
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_FILE = 'epic_games_monitor.log'
+
+# Etapas del grafo de EpicGamesNotifier.run (se pueden perfilar por separado con --profile-stage)
+STAGES = ('epic_games', 'previous_games', 'ggdeals', 'relevance', 'changes', 'images', 'notify')
+
+def configure_logging(level: int = logging.INFO):
+    """Configura el logging de la aplicación (solo desde el punto de entrada)"""
+    logging.basicConfig(
+        level=level,
+        format=LOG_FORMAT,
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler(LOG_FILE, encoding='utf-8')
+        ]
+    )
+
+def load_environment():
+    """Carga las variables del archivo .env antes de importar config"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
 class EpicGamesNotifier:
-    def __init__(self):
+    def __init__(self, daemon: bool = False):
+        from config import (
+            RELEVANCE_ENABLED, RELEVANCE_MAX_WORKERS,
+            RUN_DEADLINE_SECONDS, GGDEALS_API_KEY, METRICS_FILE
+        )
+        from epic_games_monitor import EpicGamesMonitor
+        from email_sender import EmailSender
+        from http_client import Deadline
+        from state_store import GameStateStore
+
         self.monitor = EpicGamesMonitor()
         self.email_sender = EmailSender()
-        self.relevance_evaluator = GameRelevanceEvaluator()
-        self.ggdeals_monitor = GGDealsMonitor()
-        self.database_file = DATABASE_FILE
+        self.relevance_evaluator = None
+        self.ggdeals_monitor = None
+
+        # Solo se importan las etapas habilitadas
+        if RELEVANCE_ENABLED:
+            from game_relevance import GameRelevanceEvaluator
+            # El índice de Steam solo se reconstruye en segundo plano en modo daemon
+            self.relevance_evaluator = GameRelevanceEvaluator(refresh_steam_index=daemon)
+        if GGDEALS_API_KEY:
+            from ggdeals_monitor import GGDealsMonitor
+            self.ggdeals_monitor = GGDealsMonitor()
+
+        self.state_store = GameStateStore()
+        self.relevance_max_workers = RELEVANCE_MAX_WORKERS
+        self.run_deadline_seconds = RUN_DEADLINE_SECONDS
+        self.deadline = Deadline(None)
+        self.stage_timings = {}
+        self.metrics_file = METRICS_FILE
+        # Etapa a perfilar en cada ejecución (--profile-stage)
+        self.profile_stage: Optional[str] = None
+
+    def _start_deadline(self):
+        """Inicia el presupuesto de tiempo de la ejecución y lo propaga a cada etapa"""
+        from http_client import Deadline
+
+        self.deadline = Deadline(self.run_deadline_seconds)
+        for component in (self.monitor, self.relevance_evaluator, self.ggdeals_monitor,
+                          self.email_sender.image_cache):
+            if component is not None:
+                component.session.deadline = self.deadline
     
+    def close(self):
+        """Libera los pools de hilos y las sesiones HTTP de los componentes"""
+        if self.relevance_evaluator is not None:
+            self.relevance_evaluator.close()
+        for component in (self.monitor, self.ggdeals_monitor, self.email_sender.image_cache):
+            if component is not None:
+                component.session.close()
+
     def run(self):
         """Ejecuta el proceso completo de monitoreo y notificación"""
+        from metrics import metrics
+
         logger.info("🚀 Iniciando Epic Games Monitor...")
+        self._start_deadline()
+        started_at = time.perf_counter()
+        result = 'error'
         
         try:
-            # Obtener juegos actuales
-            current_games = self.monitor.get_current_free_games()
-            
-            if not current_games:
-                logger.warning("⚠️ No se pudieron obtener juegos gratuitos")
-                return
-            
-            # Limitar a los primeros 4 juegos
-            current_games = current_games[:MAX_GAMES_TO_PROCESS]
-            logger.info(f"📋 Se encontraron {len(current_games)} juegos gratuitos")
-            
-            # Cargar juegos anteriores
-            previous_games = self.load_previous_games()
+            # Grafo de etapas: la descarga de Epic, la de GG.deals y la carga del estado
+            # son independientes; la relevancia arranca en cuanto se conocen los títulos y las
+            # imágenes solo se descargan si los juegos de Epic han cambiado (si no, no se envían)
+            graph = StageGraph()
+            graph.add('epic_games', lambda deps: self._fetch_epic_games_stage(graph))
+            graph.add('previous_games', lambda deps: self.load_previous_games())
+            graph.add('ggdeals', lambda deps: self._fetch_ggdeals_stage(graph))
+            graph.add('relevance', lambda deps: self._relevance_stage(deps['epic_games']),
+                      deps=['epic_games'])
+            graph.add('changes', lambda deps: self.games_have_changed(deps['epic_games'], deps['previous_games']),
+                      deps=['epic_games', 'previous_games'])
+            graph.add('images', lambda deps: self._images_stage(deps['epic_games'], deps['changes']),
+                      deps=['epic_games', 'changes'])
+            graph.add('notify', self._notify_stage,
+                      deps=['epic_games', 'ggdeals', 'relevance', 'changes', 'images'])
+            if self.profile_stage:
+                from profiling import Profiler
+                graph.wrap_stage(self.profile_stage, Profiler(self.profile_stage).wrap)
+
+            try:
+                graph.run()
+            finally:
+                self.stage_timings = dict(graph.timings)
+                graph.log_timings()
+                for stage, (start, end) in self.stage_timings.items():
+                    metrics.observe('stage_duration_seconds', end - start, stage=stage)
+
+            result = 'stopped' if graph.stopped else 'completed'
+            if not graph.stopped:
+                logger.info("🏁 Proceso completado exitosamente")
             
-            # Obtener ofertas de GG.deals
-            ggdeals_games = self.ggdeals_monitor.get_high_discount_games()
-            logger.info(f"🔥 Se encontraron {len(ggdeals_games)} ofertas en GG.deals")
+        except Exception as e:
+            logger.error(f"💥 Error en el proceso principal: {e}")
+            raise
 
-            # Verificar si hay cambios en Epic Games o nuevas ofertas en GG.deals
-            epic_games_changed = self.games_have_changed(current_games, previous_games)
-            has_ggdeals_offers = len(ggdeals_games) > 0
+        finally:
+            metrics.observe('run_duration_seconds', time.perf_counter() - started_at)
+            metrics.inc('runs_total', result=result)
+            metrics.set_gauge('last_run_timestamp_seconds', time.time())
+            self._write_metrics(metrics)
 
-            if epic_games_changed or has_ggdeals_offers:
-                if epic_games_changed:
-                    logger.info("🆕 Se detectaron cambios en los juegos gratuitos de Epic Games")
-                if has_ggdeals_offers:
-                    logger.info("🔥 Se encontraron ofertas con descuentos altos en GG.deals")
+    def _write_metrics(self, metrics):
+        """Exporta las métricas acumuladas al archivo configurado (METRICS_FILE)"""
+        if not self.metrics_file:
+            return
+        try:
+            metrics.write(self.metrics_file)
+        except Exception as e:
+            logger.error(f"Error escribiendo métricas en {self.metrics_file}: {e}")
+
+    def _fetch_epic_games_stage(self, graph: StageGraph) -> List[Dict]:
+        """Etapa: obtiene los juegos gratuitos actuales de Epic Games"""
+        current_games = self.monitor.get_current_free_games()
 
-                # Evaluar relevancia de los juegos de Epic Games
-                relevance_data = self.evaluate_games_relevance(current_games) if current_games else []
+        # Feed sin cambios (304 o mismo digest): no hay nada que procesar
+        if self.monitor.feed_unchanged:
+            logger.info("✅ El feed de Epic Games no ha cambiado desde el último sondeo")
+            graph.stop()
+            return []
 
-                # Enviar notificación combinada
-                if self.send_combined_notification(current_games, relevance_data, ggdeals_games):
-                    logger.info("📧 Notificación enviada exitosamente")
+        if not current_games:
+            logger.warning("⚠️ No se pudieron obtener juegos gratuitos")
+            graph.stop()
+            return []
 
-                    # Guardar juegos actuales solo si Epic Games cambió
-                    if epic_games_changed:
-                        self.save_current_games(current_games)
-                        logger.info("💾 Base de datos actualizada")
-                else:
-                    logger.error("❌ Error enviando notificación")
+        logger.info(f"📋 Se encontraron {len(current_games)} juegos gratuitos")
+        return current_games
+
+    def _fetch_ggdeals_stage(self, graph: StageGraph) -> List[Dict]:
+        """Etapa: obtiene las ofertas de GG.deals (se interrumpe si la ejecución se detiene)"""
+        if self.ggdeals_monitor is None:
+            logger.warning("GG.deals API key no configurada")
+            return []
+
+        ggdeals_games = self.ggdeals_monitor.get_high_discount_games(should_stop=lambda: graph.stopped)
+        logger.info(f"🔥 Se encontraron {len(ggdeals_games)} ofertas en GG.deals")
+        return ggdeals_games
+
+    def _relevance_stage(self, current_games: List[Dict]) -> List[Dict]:
+        """Etapa: evalúa la relevancia de los juegos de Epic Games"""
+        if self.relevance_evaluator is None:
+            return []
+
+        relevance_data = self.evaluate_games_relevance(current_games, self.deadline) if current_games else []
+        self.relevance_evaluator.log_cache_stats()
+        return relevance_data
+
+    def _images_stage(self, current_games: List[Dict], epic_games_changed: bool) -> Dict:
+        """Etapa: obtiene las imágenes a incrustar, solo si se van a enviar los juegos de Epic"""
+        if not epic_games_changed:
+            return {}
+        return self.email_sender.prefetch_images(current_games)
+
+    def _notify_stage(self, deps: Dict) -> bool:
+        """Etapa: decide si hay novedades, envía la notificación y guarda el estado"""
+        current_games = deps['epic_games']
+        ggdeals_games = deps['ggdeals']
+        relevance_data = deps['relevance']
+        images = deps['images']
+
+        # Verificar si hay cambios en Epic Games (etapa changes) o nuevas ofertas en GG.deals
+        epic_games_changed = deps['changes']
+        has_ggdeals_offers = len(ggdeals_games) > 0
+
+        if epic_games_changed or has_ggdeals_offers:
+            if epic_games_changed:
+                logger.info("🆕 Se detectaron cambios en los juegos gratuitos de Epic Games")
+            if has_ggdeals_offers:
+                logger.info("🔥 Se encontraron ofertas con descuentos altos en GG.deals")
+
+            # Enviar notificación combinada
+            if self.send_combined_notification(current_games, relevance_data, ggdeals_games, images, epic_games_changed):
+                logger.info("📧 Notificación enviada exitosamente")
+
+                # Guardar juegos actuales solo si Epic Games cambió
+                if epic_games_changed:
+                    self.save_current_games(current_games)
+                    logger.info("💾 Base de datos actualizada")
             else:
-                logger.info("✅ No hay cambios en Epic Games ni ofertas nuevas en GG.deals")
-            
-            logger.info("🏁 Proceso completado exitosamente")
-            
-        except Exception as e:
-            logger.error(f"💥 Error en el proceso principal: {e}")
-            raise
+                logger.error("❌ Error enviando notificación")
+                # No confirmar el feed para volver a procesarlo en el próximo sondeo
+                return False
+        else:
+            logger.info("✅ No hay cambios en Epic Games ni ofertas nuevas en GG.deals")
+
+        self.monitor.commit_feed_state()
+        return True
     
     def load_previous_games(self) -> List[Dict]:
-        """Carga los juegos del día anterior desde la base de datos"""
+        """Carga los juegos notificados en la última actualización"""
+        # El índice se mantiene en memoria, así que en modo daemon solo se lee una vez
         try:
-            if os.path.exists(self.database_file):
-                with open(self.database_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return data.get('games', [])
-            return []
+            return self.state_store.active_games()
         except Exception as e:
             logger.error(f"Error cargando juegos anteriores: {e}")
             return []
     
     def save_current_games(self, games: List[Dict]):
-        """Guarda los juegos actuales en la base de datos"""
+        """Registra los juegos actuales (solo anexa las ofertas nuevas o modificadas)"""
         try:
-            data = {
-                'last_update': datetime.now(timezone.utc).isoformat(),
-                'games': games,
-                'total_games': len(games)
-            }
-            
-            with open(self.database_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-                
+            self.state_store.upsert(games)
         except Exception as e:
             logger.error(f"Error guardando juegos actuales: {e}")
     
     def games_have_changed(self, current_games: List[Dict], previous_games: List[Dict]) -> bool:
-        """Verifica si los juegos han cambiado desde la última ejecución"""
-        if len(current_games) != len(previous_games):
-            logger.info(f"📊 Cambio en cantidad: {len(previous_games)} -> {len(current_games)}")
-            return True
-        
-        # Crear sets de títulos para comparación
-        current_titles = {self.normalize_title(game.get('title', '')) for game in current_games}
-        previous_titles = {self.normalize_title(game.get('title', '')) for game in previous_games}
-        
-        if current_titles != previous_titles:
-            new_games = current_titles - previous_titles
-            removed_games = previous_titles - current_titles
-            
-            if new_games:
-                logger.info(f"🆕 Juegos nuevos: {', '.join(new_games)}")
-            if removed_games:
-                logger.info(f"🗑️ Juegos removidos: {', '.join(removed_games)}")
-            
-            return True
-        
-        logger.info("🔄 Los juegos son los mismos que el día anterior")
-        return False
+        """Verifica si las promociones han cambiado desde la última ejecución.
+
+        Compara ofertas por namespace/id y fecha de fin, por lo que un cambio de
+        título en la misma oferta no cuenta como juego nuevo y una nueva
+        promoción de una oferta ya vista sí.
+        """
+        current = {self.state_store.promotion_key(game): game for game in current_games}
+        previous = {self.state_store.promotion_key(game): game for game in previous_games}
+
+        if current.keys() == previous.keys():
+            logger.info("🔄 Los juegos son los mismos que el día anterior")
+            return False
+
+        if len(current) != len(previous):
+            logger.info(f"📊 Cambio en cantidad: {len(previous)} -> {len(current)}")
+
+        new_games = [current[key] for key in current.keys() - previous.keys()]
+        removed_games = [previous[key] for key in previous.keys() - current.keys()]
+
+        if new_games:
+            first_time = [g.get('title', '') for g in new_games if not self.state_store.seen(g)]
+            repeated = [g.get('title', '') for g in new_games if self.state_store.seen(g)]
+            if first_time:
+                logger.info(f"🆕 Juegos nuevos: {', '.join(first_time)}")
+            if repeated:
+                logger.info(f"🔁 Nuevas promociones de juegos ya vistos: {', '.join(repeated)}")
+        if removed_games:
+            logger.info(f"🗑️ Juegos removidos: {', '.join(g.get('title', '') for g in removed_games)}")
+
+        return True
     
     def normalize_title(self, title: str) -> str:
-        """Normaliza un título para comparación"""
-        return title.lower().strip()
+        """Normaliza un título para comparación (ver titles.canonical_title)"""
+        from titles import canonical_title
+        return canonical_title(title)
     
-    def evaluate_games_relevance(self, games: List[Dict]) -> List[Dict]:
-        """Evalúa la relevancia de cada juego"""
+    def evaluate_games_relevance(self, games: List[Dict], deadline: Optional['Deadline'] = None) -> List[Dict]:
+        """Evalúa la relevancia de cada juego.
+
+        Si se agota el presupuesto de tiempo, devuelve los resultados terminados
+        y datos básicos para el resto.
+        """
         logger.info("🔍 Evaluando relevancia de los juegos...")
-        relevance_data = []
-        
-        for i, game in enumerate(games):
-            title = game.get('title', '')
-            logger.info(f"📊 Evaluando juego {i+1}/{len(games)}: {title}")
-            
-            try:
-                relevance = self.relevance_evaluator.evaluate_game_relevance(title)
-                relevance_data.append(relevance)
-                
-                level = relevance.get('relevance_level', 'Desconocida')
-                logger.info(f"✅ {title}: {level}")
-                
-            except Exception as e:
-                logger.error(f"❌ Error evaluando {title}: {e}")
-                # Agregar datos básicos en caso de error
-                relevance_data.append({
-                    'title': title,
-                    'relevance_level': 'Error en evaluación',
-                    'rating': 0,
-                    'popularity_score': 0,
-                    'sources': []
-                })
-        
-        return relevance_data
+
+        if self.relevance_max_workers <= 1 or len(games) <= 1:
+            relevance_data = []
+            for i, game in enumerate(games):
+                if deadline and deadline.expired:
+                    relevance_data.append(self._relevance_fallback(game.get('title', ''), timed_out=True))
+                else:
+                    relevance_data.append(self._evaluate_single_game(i, game, len(games)))
+            return relevance_data
+
+        # Modo concurrente: todos los títulos en paralelo, resultados en el orden de entrada
+        executor = ThreadPoolExecutor(max_workers=min(self.relevance_max_workers, len(games)),
+                                      thread_name_prefix='relevance')
+        try:
+            futures = [executor.submit(self._evaluate_single_game, i, game, len(games))
+                       for i, game in enumerate(games)]
+            wait(futures, timeout=deadline.remaining() if deadline else None)
+
+            relevance_data = []
+            for future, game in zip(futures, games):
+                if future.done():
+                    relevance_data.append(future.result())
+                else:
+                    logger.warning(f"⏱️ Sin tiempo para evaluar {game.get('title', '')}")
+                    relevance_data.append(self._relevance_fallback(game.get('title', ''), timed_out=True))
+            return relevance_data
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _evaluate_single_game(self, index: int, game: Dict, total: int) -> Dict:
+        """Evalúa la relevancia de un juego, con datos básicos si falla"""
+        title = game.get('title', '')
+        logger.info(f"📊 Evaluando juego {index+1}/{total}: {title}")
+
+        try:
+            relevance = self.relevance_evaluator.evaluate_game_relevance(title)
+
+            level = relevance.get('relevance_level', 'Desconocida')
+            logger.info(f"✅ {title}: {level}")
+            return relevance
+
+        except Exception as e:
+            logger.error(f"❌ Error evaluando {title}: {e}")
+            # Agregar datos básicos en caso de error
+            return self._relevance_fallback(title)
+
+    def _relevance_fallback(self, title: str, timed_out: bool = False) -> Dict:
+        """Datos de relevancia por defecto cuando la evaluación falla o no termina a tiempo"""
+        return {
+            'title': title,
+            'relevance_level': 'Sin tiempo para evaluar' if timed_out else 'Error en evaluación',
+            'rating': 0,
+            'popularity_score': 0,
+            'sources': []
+        }
     
     def send_notification(self, games: List[Dict], relevance_data: List[Dict]) -> bool:
         """Envía la notificación por correo electrónico"""
@@ -186,12 +356,14 @@ class EpicGamesNotifier:
             logger.error(f"Error enviando notificación: {e}")
             return False
 
-    def send_combined_notification(self, epic_games: List[Dict], relevance_data: List[Dict], ggdeals_games: List[Dict]) -> bool:
+    def send_combined_notification(self, epic_games: List[Dict], relevance_data: List[Dict], ggdeals_games: List[Dict],
+                                   images: Optional[Dict] = None, epic_games_changed: bool = True) -> bool:
         """Envía notificación combinada con Epic Games y GG.deals"""
         logger.info("📧 Enviando notificación combinada por correo...")
 
         try:
-            return self.email_sender.send_combined_notification(epic_games, relevance_data, ggdeals_games)
+            return self.email_sender.send_combined_notification(epic_games, relevance_data, ggdeals_games, images,
+                                                                epic_games_changed)
         except Exception as e:
             logger.error(f"Error enviando notificación combinada: {e}")
             return False
@@ -222,11 +394,47 @@ class EpicGamesNotifier:
         
         print("\n" + "="*60)
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Analiza los argumentos de línea de comandos"""
+    from config import DAEMON_INTERVAL_SECONDS, DAEMON_JITTER_SECONDS
+
+    parser = argparse.ArgumentParser(description="Epic Games Free Games Monitor")
+    parser.add_argument('--daemon', action='store_true',
+                        help='Mantener el proceso activo y sondear periódicamente')
+    parser.add_argument('--interval', type=float, default=DAEMON_INTERVAL_SECONDS,
+                        help='Segundos entre sondeos en modo daemon')
+    parser.add_argument('--jitter', type=float, default=DAEMON_JITTER_SECONDS,
+                        help='Variación aleatoria máxima (±segundos) del intervalo')
+    profile = parser.add_mutually_exclusive_group()
+    profile.add_argument('--profile', action='store_true',
+                         help='Perfilar cada ejecución (cProfile + tracemalloc) en PROFILE_DIR')
+    profile.add_argument('--profile-stage', choices=STAGES,
+                         help='Perfilar solo una etapa de cada ejecución')
+    return parser.parse_args(argv)
+
 def main():
     """Función principal"""
+    load_environment()
+    configure_logging()
+    args = parse_args()
+
     try:
-        notifier = EpicGamesNotifier()
-        notifier.run()
+        notifier = EpicGamesNotifier(daemon=args.daemon)
+        notifier.profile_stage = args.profile_stage
+        run = notifier.run
+        if args.profile:
+            from profiling import Profiler
+            run = Profiler('run').wrap(notifier.run)
+
+        if args.daemon:
+            # Reutiliza el notificador, sus sesiones y su estado entre ciclos
+            from scheduler import DaemonScheduler
+
+            scheduler = DaemonScheduler(run, args.interval, args.jitter)
+            scheduler.install_signal_handlers()
+            scheduler.run_forever()
+        else:
+            run()
         
     except KeyboardInterrupt:
         logger.info("🛑 Proceso interrumpido por el usuario")
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+from config import METRICS_HISTOGRAMS, METRICS_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'epic_monitor_'
+
+# Descripción de cada métrica (HELP del formato Prometheus)
+METRIC_HELP = {
+    'run_duration_seconds': 'Duración de cada ejecución completa',
+    'last_run_timestamp_seconds': 'Momento (epoch) en que terminó la última ejecución',
+    'runs_total': 'Ejecuciones por resultado',
+    'stage_duration_seconds': 'Duración de cada etapa del pipeline',
+    'http_request_duration_seconds': 'Duración de cada intento de petición HTTP por host',
+    'http_requests_total': 'Peticiones HTTP por host y código de estado',
+    'http_errors_total': 'Errores de red HTTP por host',
+    'http_retries_total': 'Reintentos HTTP por host',
+    'http_response_bytes_total': 'Bytes descargados por host',
+    'http_host_rate_limit': 'Peticiones por segundo permitidas ahora por host (0 = sin límite)',
+    'http_host_concurrency_limit': 'Peticiones simultáneas permitidas ahora por host',
+    'http_host_in_flight': 'Peticiones en curso por host',
+    'http_limiter_wait_seconds': 'Espera de turno en el limitador de cada host',
+    'http_throttled_total': 'Señales de sobrecarga por host y motivo (throttled, retry_after, error, latency)',
+    'relevance_evaluation_duration_seconds': 'Duración de la evaluación de relevancia de un título',
+    'relevance_cache_lookups_total': 'Consultas a la caché de relevancia por resultado',
+    'steam_index_lookups_total': 'Búsquedas de títulos en el índice local de Steam por resultado',
+    'email_render_duration_seconds': 'Duración del renderizado de un correo',
+    'email_message_bytes': 'Tamaño de cada mensaje de correo serializado',
+    'email_messages_total': 'Correos por resultado',
+    'email_send_duration_seconds': 'Duración del envío de un mensaje a todos sus destinatarios',
+}
+
+# Los tamaños de correo no usan los buckets de duración
+SIZE_BUCKETS = (16_384, 65_536, 262_144, 1_048_576, 4_194_304)
+METRIC_BUCKETS = {'email_message_bytes': SIZE_BUCKETS}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    """Valor sin pérdida de precisión (los enteros sin decimales)"""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Metrics:
+    """Registro de contadores, gauges e histogramas del proceso (seguro entre hilos).
+
+    Los contadores e histogramas se acumulan durante toda la vida del proceso
+    (en modo daemon, entre ciclos), como espera Prometheus.
+    """
+
+    def __init__(self, buckets: Sequence[float] = METRICS_BUCKETS, histograms: bool = METRICS_HISTOGRAMS):
+        self.buckets = tuple(sorted(buckets))
+        self.histograms = histograms
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        # nombre -> etiquetas -> {'count', 'sum', 'buckets': [conteo por límite]}
+        self._histograms: Dict[str, Dict[LabelKey, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        bounds = METRIC_BUCKETS.get(name, self.buckets)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            entry = series.get(key)
+            if entry is None:
+                entry = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(bounds)}
+                series[key] = entry
+            entry['count'] += 1
+            entry['sum'] += value
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observa la duración del bloque en el histograma `name`"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started_at, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    # -- Exportación -------------------------------------------------------
+
+    def to_dict(self) -> Dict:
+        """Instantánea de todas las métricas en formato JSON"""
+        with self._lock:
+            data = {'generated_at': time.time(), 'counters': {}, 'gauges': {}, 'histograms': {}}
+            for name, series in self._counters.items():
+                data['counters'][name] = [{'labels': dict(k), 'value': v} for k, v in series.items()]
+            for name, series in self._gauges.items():
+                data['gauges'][name] = [{'labels': dict(k), 'value': v} for k, v in series.items()]
+            for name, series in self._histograms.items():
+                bounds = METRIC_BUCKETS.get(name, self.buckets)
+                items = []
+                for key, entry in series.items():
+                    item = {'labels': dict(key), 'count': entry['count'], 'sum': entry['sum']}
+                    if self.histograms:
+                        item['buckets'] = {str(bound): count for bound, count in zip(bounds, entry['buckets'])}
+                    items.append(item)
+                data['histograms'][name] = items
+        return data
+
+    def to_prometheus(self) -> str:
+        """Métricas en el formato de texto de Prometheus (para el textfile collector)"""
+        lines = []
+
+        def header(name: str, kind: str):
+            full = PREFIX + name
+            lines.append(f"# HELP {full} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        def fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+            pairs = list(key) + ([extra] if extra else [])
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = header(name, 'counter')
+                for key, value in series.items():
+                    lines.append(f"{full}{fmt_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._gauges.items()):
+                full = header(name, 'gauge')
+                for key, value in series.items():
+                    lines.append(f"{full}{fmt_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                bounds = METRIC_BUCKETS.get(name, self.buckets)
+                full = header(name, 'histogram' if self.histograms else 'summary')
+                for key, entry in series.items():
+                    if self.histograms:
+                        for bound, count in zip(bounds, entry['buckets']):
+                            lines.append(f"{full}_bucket{fmt_labels(key, ('le', _format_value(bound)))} {count}")
+                        lines.append(f"{full}_bucket{fmt_labels(key, ('le', '+Inf'))} {entry['count']}")
+                    lines.append(f"{full}_sum{fmt_labels(key)} {_format_value(entry['sum'])}")
+                    lines.append(f"{full}_count{fmt_labels(key)} {entry['count']}")
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """Escribe las métricas de forma atómica: JSON si la ruta acaba en .json, Prometheus si no"""
+        content = (json.dumps(self.to_dict(), ensure_ascii=False, indent=2) if path.endswith('.json')
+                   else self.to_prometheus())
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        logger.info(f"📈 Métricas escritas en {path}")
+
+
+# Registro compartido por todo el proceso
+metrics = Metrics()
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """Etapa del pipeline: una función que recibe los resultados de sus dependencias"""
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+
+
+class StageGraph:
+    """Ejecuta un grafo de etapas en un pool de hilos, solapando las independientes"""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.stages: Dict[str, Stage] = {}
+        self.results: Dict[str, Any] = {}
+        # nombre -> (inicio, fin) en segundos relativos al inicio del grafo
+        self.timings: Dict[str, tuple] = {}
+        self._stopped = threading.Event()
+        self._started_at: Optional[float] = None
+
+    def add(self, name: str, func: Callable[[Dict[str, Any]], Any], deps: Iterable[str] = ()):
+        """Registra una etapa; func recibe un dict con los resultados de sus dependencias"""
+        stage = Stage(name, func, deps)
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"La etapa {name} depende de una etapa desconocida: {dep}")
+        self.stages[name] = stage
+
+    def wrap_stage(self, name: str, decorator: Callable[[Callable], Callable]):
+        """Sustituye la función de una etapa por decorator(función) (p. ej. para perfilarla)"""
+        if name not in self.stages:
+            raise ValueError(f"Etapa desconocida: {name}")
+        self.stages[name].func = decorator(self.stages[name].func)
+
+    def stop(self):
+        """Evita que se inicien más etapas (las que están en curso terminan)"""
+        self._stopped.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def run(self) -> Dict[str, Any]:
+        """Ejecuta todas las etapas respetando dependencias y devuelve sus resultados"""
+        self._started_at = time.perf_counter()
+        pending = dict(self.stages)
+        running = {}
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stage')
+        try:
+            while pending or running:
+                if not self.stopped:
+                    for name, stage in list(pending.items()):
+                        if all(dep in self.results for dep in stage.deps):
+                            deps = {dep: self.results[dep] for dep in stage.deps}
+                            running[executor.submit(self._run_stage, stage, deps)] = name
+                            del pending[name]
+                elif pending:
+                    logger.info(f"⏭️ Etapas omitidas: {', '.join(pending)}")
+                    pending.clear()
+
+                if not running:
+                    if pending:
+                        raise RuntimeError(f"Etapas sin dependencias resolubles: {', '.join(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # Propaga la excepción de la etapa al llamador
+                    self.results[name] = future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self.results
+
+    def _run_stage(self, stage: Stage, deps: Dict[str, Any]) -> Any:
+        start = time.perf_counter() - self._started_at
+        try:
+            return stage.func(deps)
+        finally:
+            self.timings[stage.name] = (start, time.perf_counter() - self._started_at)
+
+    def log_timings(self):
+        """Registra inicio/fin de cada etapa y la ganancia frente a ejecutarlas en serie"""
+        if not self.timings:
+            return
+
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            logger.info(f"⏱️ {name}: {start:.2f}s → {end:.2f}s ({end - start:.2f}s)")
+
+        wall = max(end for _, end in self.timings.values())
+        serial = sum(end - start for start, end in self.timings.values())
+        logger.info(f"⏱️ Total: {wall:.2f}s (en serie serían {serial:.2f}s)")
@@ -0,0 +1,150 @@
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+from config import PROFILE_DIR, PROFILE_TOP, PROFILE_TRACEMALLOC_FRAMES
+
+logger = logging.getLogger(__name__)
+
+# Hasta Python 3.11 cProfile solo mide el hilo en el que se activa; desde 3.12
+# usa sys.monitoring, que es global al intérprete y no admite dos perfiles a la vez
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+# Asignaciones de la propia maquinaria de perfilado que no interesan en el informe
+ALLOCATION_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+class Profiler:
+    """Perfil de CPU (cProfile) y de memoria (tracemalloc) de una ejecución o de una etapa.
+
+    También se perfila cada hilo que se cree mientras el bloque está en marcha
+    (etapas del grafo, workers de relevancia y de paginación), y al terminar los
+    perfiles se combinan. Con --profile-stage eso puede incluir hilos de otras
+    etapas que se solapen con la perfilada.
+
+    Cada perfil se escribe en su propio directorio dentro de `base_dir`:
+    hotspots.txt (funciones por tiempo acumulado y propio), profile.pstats
+    (para `python -m pstats` o snakeviz) y allocations.txt (principales
+    puntos de asignación de memoria).
+    """
+
+    def __init__(self, label: str = 'run', base_dir: str = PROFILE_DIR, top: int = PROFILE_TOP,
+                 frames: int = PROFILE_TRACEMALLOC_FRAMES):
+        self.label = label
+        self.base_dir = base_dir
+        self.top = top
+        self.frames = frames
+        self.run_dir: Optional[str] = None
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def wrap(self, func: Callable) -> Callable:
+        """Devuelve func perfilada en cada llamada (un directorio por llamada)"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return wrapper
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Ejecuta func bajo cProfile y tracemalloc y escribe los informes"""
+        with self._lock:
+            self._profiles = []
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+
+        main_profile = self._new_profile()
+        if PER_THREAD_PROFILES:
+            threading.setprofile(self._thread_hook)
+        started_at = time.perf_counter()
+        main_profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            main_profile.disable()
+            elapsed = time.perf_counter() - started_at
+            if PER_THREAD_PROFILES:
+                threading.setprofile(None)
+
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+            try:
+                self._write_reports(elapsed, before, after, peak)
+            except Exception as e:
+                logger.error(f"Error escribiendo el perfil de {self.label}: {e}")
+
+    def _new_profile(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def _thread_hook(self, frame, event, arg):
+        # Se ejecuta en el primer evento de cada hilo nuevo; al activarse,
+        # cProfile sustituye a este hook como función de perfilado del hilo
+        self._new_profile().enable()
+
+    def _make_run_dir(self) -> str:
+        base = os.path.join(self.base_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.label}")
+        path, suffix = base, 1
+        while os.path.exists(path):
+            suffix += 1
+            path = f"{base}-{suffix}"
+        os.makedirs(path)
+        return path
+
+    def _write_reports(self, elapsed: float, before: tracemalloc.Snapshot,
+                       after: tracemalloc.Snapshot, peak: int):
+        self.run_dir = self._make_run_dir()
+
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            # Un hilo que no llegó a ejecutar código perfilado no tiene estadísticas
+            try:
+                stats.add(profile)
+            except TypeError:
+                continue
+        stats.dump_stats(os.path.join(self.run_dir, 'profile.pstats'))
+
+        with open(os.path.join(self.run_dir, 'hotspots.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"Perfil de {self.label}: {elapsed:.3f}s, {len(profiles)} hilos perfilados\n")
+            for sort_key, title in (('cumulative', 'Tiempo acumulado'), ('tottime', 'Tiempo propio')):
+                buffer = io.StringIO()
+                stats.stream = buffer
+                stats.sort_stats(sort_key).print_stats(self.top)
+                f.write(f"\n===== {title} =====\n{buffer.getvalue()}")
+
+        after = after.filter_traces(ALLOCATION_FILTERS)
+        before = before.filter_traces(ALLOCATION_FILTERS)
+        with open(os.path.join(self.run_dir, 'allocations.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"Pico de memoria trazada: {peak / 1024 / 1024:.2f} MB\n")
+            f.write(f"\n===== Memoria asignada durante {self.label} (neta, por línea) =====\n")
+            for stat in after.compare_to(before, 'lineno')[:self.top]:
+                f.write(f"{stat}\n")
+            f.write("\n===== Memoria retenida al terminar (por traza) =====\n")
+            for stat in after.statistics('traceback')[:min(self.top, 10)]:
+                f.write(f"\n{stat}\n")
+                for line in stat.traceback.format(limit=self.frames):
+                    f.write(f"{line}\n")
+
+        logger.info(f"🔬 Perfil de {self.label} ({elapsed:.2f}s) escrito en {self.run_dir}")
@@ -0,0 +1,122 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from config import (
+    RELEVANCE_CACHE_FILE, RELEVANCE_CACHE_TTL, RELEVANCE_CACHE_MAX_ENTRIES,
+    RELEVANCE_CACHE_STALE_WHILE_REVALIDATE, RELEVANCE_CACHE_MAX_STALE
+)
+from metrics import metrics
+from titles import canonical_title
+
+logger = logging.getLogger(__name__)
+
+class RelevanceCache:
+    """Caché persistente (SQLite) de resultados de relevancia por título normalizado"""
+
+    def __init__(self, path: str = RELEVANCE_CACHE_FILE, ttl: int = RELEVANCE_CACHE_TTL,
+                 max_entries: int = RELEVANCE_CACHE_MAX_ENTRIES,
+                 stale_while_revalidate: bool = RELEVANCE_CACHE_STALE_WHILE_REVALIDATE,
+                 max_stale: int = RELEVANCE_CACHE_MAX_STALE):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_stale = max_stale
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS relevance (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_relevance_accessed ON relevance (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize_key(title: str) -> str:
+        """Normaliza un título para usarlo como clave de caché (las ediciones de un juego comparten entrada)"""
+        return canonical_title(title)
+
+    def get(self, title: str) -> Tuple[Optional[Dict], bool]:
+        """Devuelve (datos, necesita_refresco). (None, False) si no hay entrada utilizable"""
+        key = self.normalize_key(title)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, updated_at FROM relevance WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                metrics.inc('relevance_cache_lookups_total', result='miss')
+                return None, False
+
+            data, updated_at = row
+            age = now - updated_at
+
+            if age <= self.ttl:
+                self.hits += 1
+                stale = False
+            elif self.stale_while_revalidate and age <= self.ttl + self.max_stale:
+                self.stale_hits += 1
+                stale = True
+            else:
+                self.misses += 1
+                metrics.inc('relevance_cache_lookups_total', result='expired')
+                return None, False
+
+            metrics.inc('relevance_cache_lookups_total', result='stale' if stale else 'hit')
+
+            self._conn.execute("UPDATE relevance SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+
+        return json.loads(data), stale
+
+    def set(self, title: str, data: Dict, ttl: Optional[int] = None):
+        """Guarda un resultado y aplica el límite de tamaño (desalojo LRU).
+
+        Con `ttl` menor que el de la caché la entrada caduca antes: se guarda como
+        si se hubiera escrito hace (self.ttl - ttl) segundos.
+        """
+        key = self.normalize_key(title)
+        now = time.time()
+        updated_at = now - max(0, self.ttl - ttl) if ttl is not None else now
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO relevance (key, data, updated_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(data, ensure_ascii=False), updated_at, now)
+            )
+            self._conn.execute(
+                """DELETE FROM relevance WHERE key IN (
+                       SELECT key FROM relevance ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                   )""",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def log_stats(self):
+        """Registra aciertos y fallos de la caché"""
+        lookups = self.hits + self.stale_hits + self.misses
+        if not lookups:
+            return
+
+        saved = self.hits + self.stale_hits
+        logger.info(
+            f"🗄️ Caché de relevancia: {self.hits} aciertos, {self.stale_hits} obsoletos (revalidando), "
+            f"{self.misses} fallos - {saved}/{lookups} consultas externas evitadas"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Grabación y reproducción de las dependencias externas
+Permite ejecutar el pipeline completo sin red:
+
+  1. Grabar: con HTTP_RECORD_DIR=fixtures cada respuesta HTTP real (Epic, RAWG,
+     Steam, GG.deals) se guarda como un archivo JSON en ese directorio.
+  2. Reproducir: un servidor HTTP local sirve esas respuestas y un servidor SMTP
+     local acepta los correos. Con HTTP_REPLAY_URL las sesiones HTTP envían
+     todas las peticiones al servidor local.
+
+Ambos servidores admiten latencia y errores inyectados.
+
+Uso:
+    HTTP_RECORD_DIR=fixtures python main.py
+    python replay.py serve --fixtures fixtures --latency-ms 80 --error-rate 0.05
+    python replay.py run --fixtures fixtures --runs 20 --latency-ms 80 --drop-rate 0.02
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import socket
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Parámetros que no forman parte de la identidad de la petición (y no deben acabar en los fixtures)
+SECRET_PARAMS = {'key', 'api_key', 'apikey', 'token'}
+# Cabeceras de la respuesta que se conservan al grabar
+KEPT_HEADERS = {'content-type', 'etag', 'last-modified', 'cache-control'}
+# Cabeceras condicionales que se quitan al grabar: un 304 no sirve como fixture
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+
+
+def normalize_url(url: str) -> str:
+    """URL sin parámetros secretos y con la query ordenada"""
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    normalized = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    return f"{normalized}?{urlencode(query)}" if query else normalized
+
+
+def fixture_name(method: str, url: str, body: Optional[bytes] = None) -> str:
+    """Nombre del archivo de una petición: hash del método, la URL normalizada y el cuerpo"""
+    digest = hashlib.sha256(f"{method.upper()} {normalize_url(url)}".encode('utf-8'))
+    if body:
+        digest.update(body if isinstance(body, bytes) else str(body).encode('utf-8'))
+    return digest.hexdigest()[:24] + '.json'
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Adaptador que guarda cada respuesta recibida como fixture.
+
+    Las peticiones se envían sin cabeceras condicionales para grabar siempre la
+    respuesta completa (con los validadores guardados en epic_feed_cache.json el
+    feed respondería 304), y un 304 nunca sobrescribe un fixture.
+    """
+
+    def __init__(self, fixtures_dir: str, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures_dir = fixtures_dir
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+    def send(self, request, **kwargs):
+        if any(header in request.headers for header in CONDITIONAL_HEADERS):
+            request = request.copy()
+            for header in CONDITIONAL_HEADERS:
+                request.headers.pop(header, None)
+        response = super().send(request, **kwargs)
+        if response.status_code == 304:
+            logger.warning(f"📼 No se graba el 304 de {request.method} {normalize_url(request.url)}")
+            return response
+        # Lee el cuerpo completo; iter_content sigue funcionando sobre el contenido leído
+        body = response.content
+        fixture = {
+            'method': request.method,
+            'url': normalize_url(request.url),
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() in KEPT_HEADERS},
+            'body_b64': base64.b64encode(body).decode('ascii'),
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        }
+        path = os.path.join(self.fixtures_dir, fixture_name(request.method, request.url, request.body))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=1)
+        logger.debug(f"📼 Grabado {request.method} {fixture['url']} -> {path}")
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Adaptador que redirige todas las peticiones al servidor de reproducción local.
+
+    https://host/ruta?q se envía como <base>/https/host/ruta?q.
+    """
+
+    def __init__(self, replay_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.replay_url = replay_url.rstrip('/')
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request = request.copy()
+        request.url = f"{self.replay_url}/{parts.scheme}/{parts.netloc}{parts.path}"
+        if parts.query:
+            request.url += f"?{parts.query}"
+        return super().send(request, **kwargs)
+
+
+class FaultInjector:
+    """Latencia (fija + jitter) y fallos aleatorios compartidos por los servidores locales"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 drop_rate: float = 0, seed: Optional[int] = None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def roll(self) -> Optional[str]:
+        """'drop' (cortar la conexión), 'error' (respuesta de error) o None"""
+        with self._lock:
+            value = self._random.random()
+        if value < self.drop_rate:
+            return 'drop'
+        if value < self.drop_rate + self.error_rate:
+            return 'error'
+        return None
+
+
+class ReplayHTTPServer(ThreadingHTTPServer):
+    """Servidor HTTP que responde con los fixtures grabados"""
+
+    daemon_threads = True
+
+    def __init__(self, address, fixtures_dir: str, faults: FaultInjector):
+        super().__init__(address, _ReplayHandler)
+        self.fixtures_dir = fixtures_dir
+        self.faults = faults
+        self.stats = {'served': 0, 'missing': 0, 'errors': 0, 'drops': 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+
+        # /https/host/ruta?q -> https://host/ruta?q
+        scheme, _, rest = self.path.lstrip('/').partition('/')
+        original_url = f"{scheme}://{rest}"
+
+        self.server.faults.delay()
+        fault = self.server.faults.roll()
+        if fault == 'drop':
+            self.server.count('drops')
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        if fault == 'error':
+            self.server.count('errors')
+            self._respond(503, {'Content-Type': 'text/plain'}, b'fallo inyectado')
+            return
+
+        path = os.path.join(self.server.fixtures_dir, fixture_name(self.command, original_url, body))
+        if not os.path.exists(path):
+            self.server.count('missing')
+            logger.warning(f"📼 Sin fixture para {self.command} {normalize_url(original_url)}")
+            self._respond(404, {'Content-Type': 'text/plain'}, b'sin fixture')
+            return
+
+        with open(path, 'r', encoding='utf-8') as f:
+            fixture = json.load(f)
+        self.server.count('served')
+        self._respond(fixture['status'], fixture['headers'], base64.b64decode(fixture['body_b64']))
+
+    def _respond(self, status: int, headers: Dict[str, str], body: bytes):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_HEAD = _handle
+
+    def log_message(self, format, *args):
+        logger.debug(f"HTTP local: {format % args}")
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    """Servidor SMTP mínimo (sin TLS) que acepta AUTH y cuenta los mensajes recibidos"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, faults: FaultInjector):
+        super().__init__(address, _SMTPHandler)
+        self.faults = faults
+        self.stats = {'messages': 0, 'bytes': 0, 'errors': 0, 'drops': 0, 'connections': 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line: str):
+        # Las respuestas SMTP son ASCII (RFC 5321)
+        self.wfile.write((line + '\r\n').encode('ascii'))
+
+    def handle(self):
+        self.server.count('connections')
+        self._reply('220 localhost SMTP de pruebas')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self._reply('250-localhost')
+                self._reply('250-AUTH PLAIN LOGIN')
+                self._reply('250 8BITMIME')
+            elif verb == 'AUTH':
+                if command.upper().startswith('AUTH LOGIN'):
+                    self._reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self._reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                self._reply('235 2.7.0 Autenticado')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 Fin con <CRLF>.<CRLF>')
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b'.\r\n':
+                        break
+                    size += len(data)
+
+                self.server.faults.delay()
+                fault = self.server.faults.roll()
+                if fault == 'drop':
+                    self.server.count('drops')
+                    return
+                if fault == 'error':
+                    self.server.count('errors')
+                    self._reply('451 4.3.0 Fallo inyectado')
+                    continue
+                self.server.count('messages')
+                self.server.count('bytes', size)
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Adios')
+                return
+            else:
+                self._reply('502 Comando no implementado')
+
+
+def start_stand_ins(fixtures_dir: str, faults: FaultInjector, host: str = '127.0.0.1',
+                    http_port: int = 0, smtp_port: int = 0):
+    """Arranca los servidores HTTP y SMTP locales en hilos; devuelve (http, smtp)"""
+    http_server = ReplayHTTPServer((host, http_port), fixtures_dir, faults)
+    smtp_server = StandInSMTPServer((host, smtp_port), faults)
+    for server in (http_server, smtp_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return http_server, smtp_server
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_load_test(args, faults: FaultInjector):
+    """Ejecuta EpicGamesNotifier.run varias veces contra los servidores locales"""
+    http_server, smtp_server = start_stand_ins(args.fixtures, faults)
+    # El directorio de trabajo se borra al terminar, aunque falle alguna ejecución
+    with tempfile.TemporaryDirectory(prefix='replay-') as work_dir:
+        try:
+            _run_load_test(args, http_server, smtp_server, work_dir)
+        finally:
+            http_server.shutdown()
+            smtp_server.shutdown()
+
+
+def _run_load_test(args, http_server: 'ReplayHTTPServer', smtp_server: 'StandInSMTPServer', work_dir: str):
+    state_files = {
+        'STATE_LOG_FILE': os.path.join(work_dir, 'games_state.jsonl'),
+        'EPIC_FEED_CACHE_FILE': os.path.join(work_dir, 'epic_feed_cache.json'),
+        'RELEVANCE_CACHE_FILE': os.path.join(work_dir, 'relevance_cache.db'),
+    }
+
+    # config lee el entorno al importarse: todo se fija antes de importar main
+    image_cache_dir = os.path.join(work_dir, 'image_cache')
+    os.environ.update(state_files)
+    os.environ.update({
+        'IMAGE_CACHE_DIR': image_cache_dir,
+        'STEAM_INDEX_FILE': os.path.join(work_dir, 'steam_apps.idx'),
+        'HTTP_REPLAY_URL': f"http://127.0.0.1:{http_server.server_port}",
+        'HTTP_RECORD_DIR': '',
+        'EMAIL_SMTP_SERVER': '127.0.0.1',
+        'EMAIL_SMTP_PORT': str(smtp_server.server_address[1]),
+        'EMAIL_SMTP_USE_STARTTLS': 'false',
+        'SUBSCRIBERS_FILE': args.subscribers or os.path.join(work_dir, 'subscribers.json'),
+    })
+    if args.no_relevance_cache:
+        os.environ['RELEVANCE_CACHE_ENABLED'] = 'false'
+    # Las claves no forman parte del nombre de los fixtures: cualquier valor activa esas fuentes
+    for name, default in (('EMAIL_FROM', 'monitor@example.com'), ('EMAIL_PASSWORD', 'replay'),
+                          ('EMAIL_TO', 'destinatario@example.com'), ('RAWG_API_KEY', 'replay'),
+                          ('GGDEALS_API_KEY', 'replay')):
+        os.environ.setdefault(name, default)
+
+    from main import EpicGamesNotifier
+
+    durations = []
+    stage_durations: Dict[str, List[float]] = {}
+    failures = 0
+    for i in range(args.runs):
+        # Cada ejecución empieza sin estado para recorrer el pipeline completo
+        if not args.keep_state:
+            for path in state_files.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            shutil.rmtree(image_cache_dir, ignore_errors=True)
+
+        started_at = time.perf_counter()
+        notifier = None
+        try:
+            notifier = EpicGamesNotifier()
+            notifier.run()
+            durations.append(time.perf_counter() - started_at)
+            for stage, (start, end) in notifier.stage_timings.items():
+                stage_durations.setdefault(stage, []).append(end - start)
+        except Exception as e:
+            failures += 1
+            logger.error(f"Ejecución {i + 1} fallida: {e}")
+        finally:
+            # Cada ejecución crea sus propios pools de hilos y sesiones
+            if notifier is not None:
+                notifier.close()
+
+    print(f"\n📊 {len(durations)}/{args.runs} ejecuciones completadas ({failures} con error)")
+    if durations:
+        print(f"   total: media {statistics.mean(durations):.3f}s  p50 {_percentile(durations, 0.5):.3f}s  "
+              f"p95 {_percentile(durations, 0.95):.3f}s  máx {max(durations):.3f}s")
+        for stage, values in stage_durations.items():
+            print(f"   {stage:<16} media {statistics.mean(values):.3f}s  p95 {_percentile(values, 0.95):.3f}s")
+    print(f"   HTTP local: {http_server.stats}")
+    print(f"   SMTP local: {smtp_server.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidores HTTP/SMTP locales para pruebas sin red")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('serve', 'Sirve los fixtures hasta Ctrl+C'),
+                            ('run', 'Ejecuta el pipeline completo N veces contra los servidores locales')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--fixtures', default='fixtures', help='Directorio de fixtures grabados')
+        sub.add_argument('--latency-ms', type=float, default=0, help='Latencia añadida a cada respuesta')
+        sub.add_argument('--jitter-ms', type=float, default=0, help='Latencia aleatoria adicional máxima')
+        sub.add_argument('--error-rate', type=float, default=0,
+                         help='Fracción de respuestas con error (HTTP 503 / SMTP 451)')
+        sub.add_argument('--drop-rate', type=float, default=0, help='Fracción de conexiones cortadas')
+        sub.add_argument('--seed', type=int, default=None, help='Semilla de la inyección de fallos')
+        if name == 'serve':
+            sub.add_argument('--http-port', type=int, default=8765)
+            sub.add_argument('--smtp-port', type=int, default=8025)
+        else:
+            sub.add_argument('--runs', type=int, default=10)
+            sub.add_argument('--subscribers', default=None, help='Archivo de suscriptores a usar')
+            sub.add_argument('--keep-state', action='store_true',
+                             help='Conserva estado y cachés entre ejecuciones (sondeos repetidos)')
+            sub.add_argument('--no-relevance-cache', action='store_true',
+                             help='Evalúa la relevancia sin caché (RELEVANCE_CACHE_ENABLED=false)')
+
+    args = parser.parse_args()
+    # config se importa más tarde (run_load_test); lo que se fija aquí tiene prioridad sobre .env
+    from main import load_environment
+    load_environment()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    faults = FaultInjector(args.latency_ms, args.jitter_ms, args.error_rate, args.drop_rate, args.seed)
+
+    if args.command == 'run':
+        run_load_test(args, faults)
+        return
+
+    http_server, smtp_server = start_stand_ins(args.fixtures, faults, http_port=args.http_port,
+                                               smtp_port=args.smtp_port)
+    print(f"📼 HTTP local en http://127.0.0.1:{http_server.server_port} (HTTP_REPLAY_URL)")
+    print(f"📨 SMTP local en 127.0.0.1:{smtp_server.server_address[1]} "
+          f"(EMAIL_SMTP_SERVER/EMAIL_SMTP_PORT, EMAIL_SMTP_USE_STARTTLS=false)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\nHTTP: {http_server.stats}\nSMTP: {smtp_server.stats}")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import logging
+import random
+import signal
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+class DaemonScheduler:
+    """Ejecuta una tarea periódicamente con jitter hasta recibir SIGTERM/SIGINT"""
+
+    def __init__(self, task: Callable[[], None], interval: float, jitter: float = 0.0):
+        self.task = task
+        self.interval = interval
+        self.jitter = jitter
+        self.cycles = 0
+        self._stop_event = threading.Event()
+
+    def stop(self, *_):
+        """Solicita un apagado limpio al terminar el ciclo en curso"""
+        if not self._stop_event.is_set():
+            logger.info("🛑 Señal de parada recibida, terminando tras el ciclo actual...")
+        self._stop_event.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def next_delay(self) -> float:
+        """Intervalo hasta el próximo ciclo, con jitter uniforme en ±jitter"""
+        return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    def run_forever(self):
+        logger.info(f"🔁 Modo daemon: sondeo cada {self.interval:.0f}s (±{self.jitter:.0f}s)")
+
+        while not self._stop_event.is_set():
+            self.cycles += 1
+            started_at = time.monotonic()
+
+            try:
+                self.task()
+            except Exception as e:
+                # Un ciclo fallido no detiene el daemon
+                logger.error(f"💥 Error en el ciclo {self.cycles}: {e}")
+
+            elapsed = time.monotonic() - started_at
+            delay = self.next_delay()
+            logger.info(f"⏳ Ciclo {self.cycles} completado en {elapsed:.2f}s, próximo en {delay:.0f}s")
+            self._stop_event.wait(delay)
+
+        logger.info(f"👋 Daemon detenido tras {self.cycles} ciclos")
@@ -0,0 +1,177 @@
+import logging
+import queue
+import smtplib
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Errores tras los que la conexión se descarta y se reintenta con una nueva
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout)
+
+class SMTPConnectionPool:
+    """Pool pequeño de conexiones SMTP autenticadas reutilizables"""
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 size: int = 3, use_starttls: bool = True, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.use_starttls = use_starttls
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_starttls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+
+        with self._lock:
+            self.connections_opened += 1
+        return server
+
+    def acquire(self) -> smtplib.SMTP:
+        """Obtiene una conexión libre o abre una nueva (como máximo `size` a la vez)"""
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, server: smtplib.SMTP, broken: bool = False):
+        """Devuelve una conexión al pool, o la cierra si está rota"""
+        if broken:
+            try:
+                server.close()
+            except Exception:
+                pass
+        else:
+            self._idle.put(server)
+        self._slots.release()
+
+    def close(self):
+        """Cierra (QUIT) todas las conexiones inactivas"""
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+
+class EmailDispatcher:
+    """Envía mensajes concurrentemente sobre un pool de conexiones SMTP.
+
+    Si no se puede conectar o autenticar, el error se considera fatal: el resto
+    de destinatarios (también los de envíos posteriores, hasta close) fallan
+    sin volver a intentarlo, para no acumular intentos de login fallidos que
+    pueden bloquear la cuenta.
+    """
+
+    def __init__(self, pool: SMTPConnectionPool, max_attempts: Optional[int] = None):
+        self.pool = pool
+        # Por defecto, suficientes intentos para descartar todas las conexiones inactivas caídas
+        self.max_attempts = max_attempts or pool.size + 1
+        self.fatal_error: Optional[Exception] = None
+
+    def _abort(self, error: Exception):
+        if self.fatal_error is None:
+            self.fatal_error = error
+            logger.error(f"Error conectando al servidor SMTP, se cancela el envío: {error}")
+
+    def close(self):
+        """Cierra las conexiones del pool y permite volver a intentar conectar"""
+        self.pool.close()
+        self.fatal_error = None
+
+    def send_to_recipients(self, from_email: str, recipients: List[str], message_bytes: bytes) -> Dict:
+        """Envía el mismo mensaje (ya serializado, sin cabecera To) a cada destinatario"""
+        started_at = time.perf_counter()
+        sent = 0
+        failed = []
+
+        # La primera conexión se abre antes de repartir el trabajo: con credenciales
+        # erróneas solo se hace un intento de login, no uno por hilo
+        if self.fatal_error is None:
+            try:
+                self.pool.release(self.pool.acquire())
+            except Exception as e:
+                self._abort(e)
+        if self.fatal_error is not None:
+            return {'sent': 0, 'failed': list(recipients), 'elapsed': time.perf_counter() - started_at, 'rate': 0.0}
+
+        with ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix='smtp') as executor:
+            results = executor.map(
+                lambda recipient: self._send_one(from_email, recipient, message_bytes),
+                recipients
+            )
+            for recipient, ok in zip(recipients, results):
+                if ok:
+                    sent += 1
+                else:
+                    failed.append(recipient)
+
+        elapsed = time.perf_counter() - started_at
+        rate = sent / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"📨 {sent}/{len(recipients)} correos enviados en {elapsed:.2f}s "
+            f"({rate:.1f} msg/s, {self.pool.connections_opened} conexiones SMTP abiertas)"
+        )
+
+        return {'sent': sent, 'failed': failed, 'elapsed': elapsed, 'rate': rate}
+
+    def _send_one(self, from_email: str, recipient: str, message_bytes: bytes) -> bool:
+        data = f"To: {recipient}\r\n".encode('utf-8') + message_bytes
+
+        for attempt in range(1, self.max_attempts + 1):
+            if self.fatal_error is not None:
+                return False
+            try:
+                server = self.pool.acquire()
+            except Exception as e:
+                self._abort(e)
+                return False
+
+            try:
+                server.sendmail(from_email, [recipient], data)
+            except CONNECTION_ERRORS as e:
+                # Conexión caída: se descarta y se reintenta con una nueva
+                self.pool.release(server, broken=True)
+                logger.warning(f"Conexión SMTP perdida enviando a {recipient} (intento {attempt}): {e}")
+                continue
+            except smtplib.SMTPException as e:
+                self.pool.release(server)
+                logger.error(f"Error enviando correo a {recipient}: {e}")
+                return False
+            except Exception as e:
+                self.pool.release(server, broken=True)
+                logger.error(f"Error inesperado enviando correo a {recipient}: {e}")
+                return False
+
+            self.pool.release(server)
+            return True
+
+        return False
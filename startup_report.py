@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Informe de arranque
+Mide, con `python -X importtime`, cuánto tarda el proceso en estar listo para
+hacer la primera petición (importar main y construir EpicGamesNotifier) y qué
+módulos dominan ese tiempo.
+
+Uso:
+    python startup_report.py [--top 15] [--max-ms 800]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# Código que ejecuta el proceso medido: termina justo antes de la primera petición
+PROBE = """
+import time
+_t0 = time.perf_counter()
+import main
+main.load_environment()
+main.EpicGamesNotifier()
+print(f"READY_MS={(time.perf_counter() - _t0) * 1000:.1f}")
+"""
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    """Devuelve (self_us, cumulative_us, módulo) de la salida de -X importtime"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            _, values = line.split(':', 1)
+            self_us, cumulative_us, module = values.split('|')
+            entries.append((int(self_us), int(cumulative_us), module.rstrip()))
+        except ValueError:
+            continue
+    return entries
+
+def main():
+    parser = argparse.ArgumentParser(description="Informe de tiempo de arranque")
+    parser.add_argument('--top', type=int, default=15, help='Módulos a mostrar')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='Falla (exit 1) si el tiempo hasta la primera petición lo supera')
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    process_ms = (time.perf_counter() - started_at) * 1000
+
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        sys.exit(result.returncode)
+
+    ready_ms = None
+    for line in result.stdout.splitlines():
+        if line.startswith('READY_MS='):
+            ready_ms = float(line.split('=', 1)[1])
+
+    entries = parse_importtime(result.stderr)
+    print(f"⏱️ Proceso completo: {process_ms:.1f} ms")
+    print(f"⏱️ Importar main + construir EpicGamesNotifier: {ready_ms:.1f} ms")
+    print(f"\n{'acumulado (ms)':>15} {'propio (ms)':>12}  módulo")
+    for self_us, cumulative_us, module in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:15.1f} {self_us / 1000:12.1f}  {module}")
+
+    if args.max_ms is not None and ready_ms is not None and ready_ms > args.max_ms:
+        print(f"\n❌ El arranque ({ready_ms:.1f} ms) supera el límite de {args.max_ms:.1f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
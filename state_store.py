@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List
+from titles import canonical_title
+from config import STATE_LOG_FILE, DATABASE_FILE, STATE_RETENTION_DAYS, STATE_COMPACT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Campos que cambian en cada descarga y no indican un cambio en la oferta
+VOLATILE_FIELDS = ('extracted_at',)
+
+def _stable(game: Dict) -> Dict:
+    return {k: v for k, v in game.items() if k not in VOLATILE_FIELDS}
+
+class GameStateStore:
+    """Estado de promociones indexado por namespace/id sobre un log JSONL de solo anexado.
+
+    Cada línea del log es una operación:
+      {"op": "upsert", "key": ..., "game": {...}, "at": ...}  -> oferta vista en una promoción
+                                                              (tras compactar incluye first_seen y promotions)
+      {"op": "active", "keys": [...], "at": ...}             -> conjunto notificado actualmente
+    Al cargar se reconstruye en memoria un índice clave -> registro, por lo que
+    las consultas son O(1) y cada cambio solo anexa unas pocas líneas.
+    """
+
+    def __init__(self, path: str = STATE_LOG_FILE, legacy_file: str = DATABASE_FILE,
+                 retention_days: int = STATE_RETENTION_DAYS, compact_threshold: int = STATE_COMPACT_THRESHOLD):
+        self.path = path
+        self.legacy_file = legacy_file
+        self.retention_days = retention_days
+        self.compact_threshold = compact_threshold
+        # clave -> {'game', 'first_seen', 'last_seen', 'promotions': [end_date, ...]}
+        self.offers: Dict[str, Dict] = {}
+        self.active_keys: List[str] = []
+        self._line_count = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def offer_key(game: Dict) -> str:
+        """Clave estable de una oferta: namespace/id de Epic, o el título canónico si no los hay"""
+        namespace = game.get('namespace')
+        offer_id = game.get('id')
+        if namespace and offer_id:
+            return f"{namespace}:{offer_id}"
+        title = game.get('title') or ''
+        return f"title:{canonical_title(title) or title.lower().strip()}"
+
+    @classmethod
+    def promotion_key(cls, game: Dict) -> tuple:
+        """Identifica una promoción concreta: la misma oferta con otra fecha es otra promoción"""
+        return (cls.offer_key(game), game.get('end_date'))
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+
+            if os.path.exists(self.path):
+                self._replay_log()
+            elif os.path.exists(self.legacy_file):
+                self._migrate_legacy()
+
+    def _replay_log(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._apply(json.loads(line))
+                    self._line_count += 1
+                except Exception as e:
+                    logger.error(f"Línea inválida en {self.path}: {e}")
+
+    def _migrate_legacy(self):
+        """Importa el estado desde el antiguo last_games.json"""
+        try:
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                games = json.load(f).get('games', [])
+            logger.info(f"Migrando {len(games)} juegos desde {self.legacy_file}")
+            self._write(self._upsert_ops(games, self._now()))
+        except Exception as e:
+            logger.error(f"Error migrando {self.legacy_file}: {e}")
+
+    def _apply(self, op: Dict):
+        if op['op'] == 'upsert':
+            game = op['game']
+            record = self.offers.get(op['key'])
+            if record is None:
+                record = {'first_seen': op.get('first_seen', op['at']), 'promotions': list(op.get('promotions', []))}
+                self.offers[op['key']] = record
+            record['game'] = game
+            record['last_seen'] = op['at']
+            if game.get('end_date') not in record['promotions']:
+                record['promotions'].append(game.get('end_date'))
+        elif op['op'] == 'active':
+            self.active_keys = list(op['keys'])
+
+    def _upsert_ops(self, games: Iterable[Dict], now: str) -> List[Dict]:
+        ops = []
+        keys = []
+        for game in games:
+            key = self.offer_key(game)
+            keys.append(key)
+            record = self.offers.get(key)
+            # Solo se anexa si la oferta es nueva o cambió algún dato
+            if record is None or _stable(record['game']) != _stable(game):
+                ops.append({'op': 'upsert', 'key': key, 'game': game, 'at': now})
+        if keys != self.active_keys:
+            ops.append({'op': 'active', 'keys': keys, 'at': now})
+        return ops
+
+    def _write(self, ops: List[Dict]):
+        if not ops:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for op in ops:
+                f.write(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + '\n')
+                self._apply(op)
+        self._line_count += len(ops)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def seen(self, game: Dict) -> bool:
+        """¿Se ha visto antes esta oferta (en cualquier promoción)?"""
+        self._ensure_loaded()
+        return self.offer_key(game) in self.offers
+
+    def active_games(self) -> List[Dict]:
+        """Juegos notificados en la última actualización"""
+        self._ensure_loaded()
+        return [self.offers[key]['game'] for key in self.active_keys if key in self.offers]
+
+    def upsert(self, games: List[Dict]):
+        """Registra los juegos actuales como el conjunto activo"""
+        self._ensure_loaded()
+        with self._lock:
+            self._write(self._upsert_ops(games, self._now()))
+            if self._line_count > self.compact_threshold:
+                self._compact()
+
+    def _compact(self):
+        """Reescribe el log con una línea por oferta retenida y el conjunto activo"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).isoformat()
+        active = set(self.active_keys)
+        kept = {key: record for key, record in self.offers.items()
+                if key in active or record['last_seen'] >= cutoff}
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            lines = 0
+            for key, record in kept.items():
+                op = {'op': 'upsert', 'key': key, 'game': record['game'], 'at': record['last_seen'],
+                      'first_seen': record['first_seen'], 'promotions': record['promotions']}
+                f.write(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + '\n')
+                lines += 1
+            f.write(json.dumps({'op': 'active', 'keys': self.active_keys, 'at': self._now()},
+                               ensure_ascii=False, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+
+        self.offers = kept
+        self._line_count = lines + 1
+        logger.info(f"🗜️ Log de estado compactado: {len(kept)} ofertas retenidas")
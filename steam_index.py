@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Índice local de aplicaciones de Steam
+Resuelve títulos a appids sin peticiones por título: la lista completa de
+aplicaciones de Steam se descarga de una vez, periódicamente, y se guarda en un
+archivo binario ordenado por hash que se consulta con mmap y búsqueda binaria.
+
+Formato del archivo (little-endian):
+    cabecera   magic 'STIX', versión, nº de entradas exactas, nº de entradas
+               aproximadas y fecha de construcción (epoch)
+    exactas    (hash64 del nombre normalizado, appid, offset del nombre) ordenadas
+    aproximad. igual, con la clave canónica (titles.canonical_title: sin
+               sufijos de edición) de los nombres en los que difiere de la exacta
+    nombres    nombre original de cada app: longitud (u16) + UTF-8
+
+Uso:
+    python steam_index.py refresh [--if-stale]
+    python steam_index.py lookup "Hades"
+"""
+
+import argparse
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+if __name__ == "__main__":
+    # Ejecutado como script: el .env se carga antes de que config lea el entorno
+    from main import load_environment
+    load_environment()
+
+from http_client import Deadline, DeadlineExceeded, HttpSession
+from json_stream import iter_json_array
+from titles import canonical_title, fold
+from config import STEAM_API_KEY, STEAM_INDEX_FILE, STEAM_INDEX_MAX_AGE_HOURS, STEAM_INDEX_REFRESH_DEADLINE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Volcado completo (sin clave) y listado paginado de IStoreService (con STEAM_API_KEY, solo juegos)
+APP_LIST_URL = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
+STORE_APP_LIST_URL = "https://api.steampowered.com/IStoreService/GetAppList/v1/"
+STORE_PAGE_SIZE = 50000
+STREAM_CHUNK_SIZE = 64 * 1024
+# Cada cuántas apps se comprueba el deadline durante la descarga en streaming
+DEADLINE_CHECK_INTERVAL = 4096
+
+MAGIC = b'STIX'
+VERSION = 3
+HEADER = struct.Struct('<4sHHIIQ')
+ENTRY = struct.Struct('<QII')
+NAME_LENGTH = struct.Struct('<H')
+HASH = struct.Struct('<Q')
+
+# Entradas de la lista que no son juegos (el volcado sin clave incluye todo)
+NON_GAME_PATTERN = re.compile(r"\b(?:soundtrack|ost|demo|playtest|dedicated server|sdk|trailer|artbook)\b")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def build_index(apps: Iterable[Tuple[int, str]], path: str) -> int:
+    """Escribe el índice de forma atómica. Devuelve el número de apps indexadas"""
+    names = bytearray()
+    exact: List[Tuple[int, int, int]] = []
+    loose: List[Tuple[int, int, int]] = []
+
+    for appid, name in apps:
+        key = fold(name)
+        if not key or NON_GAME_PATTERN.search(key):
+            continue
+        encoded = name.encode('utf-8')[:0xFFFF]
+        offset = len(names)
+        names += NAME_LENGTH.pack(len(encoded)) + encoded
+        exact.append((_hash(key), appid, offset))
+        approximate = canonical_title(name)
+        if approximate and approximate != key:
+            loose.append((_hash(approximate), appid, offset))
+
+    # A igual clave, el appid más bajo (normalmente el juego base) va primero
+    exact.sort()
+    loose.sort()
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(exact), len(loose), int(time.time())))
+        for table in (exact, loose):
+            for entry in table:
+                f.write(ENTRY.pack(*entry))
+        f.write(names)
+    os.replace(tmp_path, path)
+    return len(exact)
+
+
+def _check_deadline(session: HttpSession, count: int):
+    """Los timeouts solo limitan cada lectura: en una descarga larga se comprueba el total"""
+    if count % DEADLINE_CHECK_INTERVAL == 0 and session.deadline and session.deadline.expired:
+        raise DeadlineExceeded("Presupuesto de tiempo agotado descargando la lista de apps de Steam")
+
+
+def iter_app_list(session: HttpSession, api_key: str = STEAM_API_KEY) -> Iterator[Tuple[int, str]]:
+    """Descarga la lista de aplicaciones en streaming, sin cargar el volcado entero en memoria"""
+    count = 0
+    if not api_key:
+        response = session.get(APP_LIST_URL, stream=True)
+        try:
+            response.raise_for_status()
+            for app in iter_json_array(response.iter_content(chunk_size=STREAM_CHUNK_SIZE),
+                                       ('applist', 'apps'), {'appid': None, 'name': None}):
+                count += 1
+                _check_deadline(session, count)
+                if app.get('name'):
+                    yield int(app['appid']), app['name']
+        finally:
+            response.close()
+        return
+
+    last_appid = 0
+    while True:
+        params = {'key': api_key, 'include_games': 'true', 'max_results': STORE_PAGE_SIZE,
+                  'last_appid': last_appid}
+        response = session.get(STORE_APP_LIST_URL, params=params, stream=True)
+        meta = {}
+        try:
+            response.raise_for_status()
+            for app in iter_json_array(response.iter_content(chunk_size=STREAM_CHUNK_SIZE),
+                                       ('response', 'apps'), {'appid': None, 'name': None},
+                                       capture=('response.have_more_results', 'response.last_appid'),
+                                       meta=meta):
+                count += 1
+                _check_deadline(session, count)
+                if app.get('name'):
+                    yield int(app['appid']), app['name']
+        finally:
+            response.close()
+        if not meta.get('response.have_more_results') or not meta.get('response.last_appid'):
+            return
+        last_appid = meta['response.last_appid']
+
+
+def refresh_index(path: str = STEAM_INDEX_FILE, session: Optional[HttpSession] = None,
+                  deadline_seconds: float = STEAM_INDEX_REFRESH_DEADLINE_SECONDS) -> int:
+    """Reconstruye el índice desde la lista de aplicaciones de Steam (como mucho deadline_seconds)"""
+    started_at = time.perf_counter()
+    session = session or HttpSession()
+    session.deadline = Deadline(deadline_seconds)
+    count = build_index(iter_app_list(session), path)
+    logger.info(f"🗂️ Índice de Steam actualizado: {count:,} apps en {time.perf_counter() - started_at:.1f}s ({path})")
+    return count
+
+
+class SteamAppIndex:
+    """Índice de apps de Steam en un archivo mapeado en memoria (solo lectura, seguro entre hilos)"""
+
+    def __init__(self, path: str = STEAM_INDEX_FILE):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"Índice de Steam truncado: {path}")
+        magic, version, _, self.exact_count, self.loose_count, self.built_at = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Índice de Steam con formato desconocido: {path}")
+        self._exact_base = HEADER.size
+        self._loose_base = self._exact_base + self.exact_count * ENTRY.size
+        self._names_base = self._loose_base + self.loose_count * ENTRY.size
+
+    @classmethod
+    def load(cls, path: str = STEAM_INDEX_FILE) -> Optional['SteamAppIndex']:
+        """Abre el índice; None si no existe o no es válido"""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error abriendo el índice de Steam: {e}")
+            return None
+
+    def __len__(self) -> int:
+        return self.exact_count
+
+    def is_stale(self, max_age_hours: float = STEAM_INDEX_MAX_AGE_HOURS) -> bool:
+        return time.time() - self.built_at > max_age_hours * 3600
+
+    def close(self):
+        self._map.close()
+
+    def find(self, title: str) -> Optional[Tuple[int, str]]:
+        """(appid, nombre en Steam) por nombre plegado o, si no, por clave canónica (sin sufijos de edición)"""
+        key = fold(title)
+        if not key:
+            return None
+        found = self._search(self._exact_base, self.exact_count, key, fold)
+        if found:
+            return found
+
+        approximate = canonical_title(title)
+        if not approximate:
+            return None
+        return (self._search(self._exact_base, self.exact_count, approximate, fold)
+                or self._search(self._loose_base, self.loose_count, approximate, canonical_title))
+
+    def _search(self, base: int, count: int, key: str,
+                key_of: Callable[[str], str]) -> Optional[Tuple[int, str]]:
+        target = _hash(key)
+        # Primera entrada con hash >= target. Los hashes están distribuidos uniformemente,
+        # así que se estima su posición (búsqueda por interpolación: unas pocas lecturas
+        # en lugar de log2(n)); en rangos pequeños se recurre a la bisección
+        lo, hi = 0, count
+        lo_hash, hi_hash = 0, 1 << 64
+        while lo < hi:
+            if hi - lo > 8 and hi_hash > lo_hash:
+                mid = min(max(lo + (target - lo_hash) * (hi - lo) // (hi_hash - lo_hash), lo), hi - 1)
+            else:
+                mid = (lo + hi) // 2
+            entry_hash = HASH.unpack_from(self._map, base + mid * ENTRY.size)[0]
+            if entry_hash < target:
+                lo, lo_hash = mid + 1, entry_hash
+            else:
+                hi, hi_hash = mid, entry_hash
+
+        # Entradas con el mismo hash: se comprueba el nombre por si hay colisión
+        while lo < count:
+            entry_hash, appid, offset = ENTRY.unpack_from(self._map, base + lo * ENTRY.size)
+            if entry_hash != target:
+                break
+            name = self._name(offset)
+            if key_of(name) == key:
+                return appid, name
+            lo += 1
+        return None
+
+    def _name(self, offset: int) -> str:
+        position = self._names_base + offset
+        (length,) = NAME_LENGTH.unpack_from(self._map, position)
+        start = position + NAME_LENGTH.size
+        return self._map[start:start + length].decode('utf-8', errors='replace')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice local de aplicaciones de Steam")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    refresh = subparsers.add_parser('refresh', help='Descarga la lista de apps y reconstruye el índice')
+    refresh.add_argument('--if-stale', action='store_true',
+                         help='Solo si el índice no existe o es más antiguo que STEAM_INDEX_MAX_AGE_HOURS')
+    lookup = subparsers.add_parser('lookup', help='Busca títulos en el índice')
+    lookup.add_argument('titles', nargs='+')
+    parser.add_argument('--index', default=STEAM_INDEX_FILE, help='Archivo del índice')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.command == 'refresh':
+        index = SteamAppIndex.load(args.index) if args.if_stale else None
+        if index is not None and not index.is_stale():
+            print(f"✅ El índice de Steam está al día ({len(index):,} apps)")
+            return
+        refresh_index(args.index)
+        return
+
+    index = SteamAppIndex.load(args.index)
+    if index is None:
+        print(f"❌ No hay índice en {args.index} (python steam_index.py refresh)")
+        sys.exit(1)
+    for title in args.titles:
+        started_at = time.perf_counter()
+        found = index.find(title)
+        elapsed_us = (time.perf_counter() - started_at) * 1e6
+        print(f"{title!r}: {found[1]!r} (appid {found[0]})" if found else f"{title!r}: no encontrado",
+              f"[{elapsed_us:.0f} µs]")
+
+
+if __name__ == "__main__":
+    main()
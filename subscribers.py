@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from config import SUBSCRIBERS_FILE, EMAIL_TO
+
+logger = logging.getLogger(__name__)
+
+# Orden de los niveles de relevancia (ver GameRelevanceEvaluator._calculate_relevance_level)
+RELEVANCE_RANKS = [('MUY ALTA', 4), ('ALTA', 3), ('MEDIA', 2), ('BAJA', 1)]
+
+CONTENT_TYPES = ('both', 'epic', 'deals')
+
+def relevance_rank(level: Optional[str]) -> int:
+    """Convierte un nivel de relevancia ('🔥 MUY ALTA - ...' o 'ALTA') en un rango numérico"""
+    level = (level or '').upper()
+    for name, rank in RELEVANCE_RANKS:
+        if name in level:
+            return rank
+    return 0
+
+
+class Subscriber:
+    """Suscriptor con sus filtros de contenido"""
+
+    def __init__(self, email: str, min_relevance: Optional[str] = None, min_discount: float = 0,
+                 locale: Optional[str] = None, content: str = 'both'):
+        if content not in CONTENT_TYPES:
+            raise ValueError(f"Tipo de contenido inválido para {email}: {content}")
+        self.email = email
+        self.min_relevance = relevance_rank(min_relevance)
+        self.min_discount = float(min_discount or 0)
+        self.locale = locale
+        self.content = content
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Subscriber':
+        return cls(
+            email=data['email'],
+            min_relevance=data.get('min_relevance'),
+            min_discount=data.get('min_discount', 0),
+            locale=data.get('locale'),
+            content=data.get('content', 'both')
+        )
+
+    def wants_epic_game(self, game: Dict, relevance: Dict) -> bool:
+        if self.content == 'deals':
+            return False
+        if self.min_relevance and relevance_rank(relevance.get('relevance_level')) < self.min_relevance:
+            return False
+        # Las ofertas multi-región indican en qué regiones están disponibles
+        regions = game.get('regions')
+        if self.locale and regions and not any(r.split(':', 1)[0] == self.locale for r in regions):
+            return False
+        return True
+
+    def wants_deal(self, deal: Dict) -> bool:
+        if self.content == 'epic':
+            return False
+        return deal.get('estimated_discount', 0) >= self.min_discount
+
+
+class SubscriberRegistry:
+    """Registro de suscriptores y agrupación por contenido efectivo"""
+
+    def __init__(self, subscribers: List[Subscriber]):
+        self.subscribers = subscribers
+
+    @classmethod
+    def load(cls, path: str = SUBSCRIBERS_FILE, fallback_emails: Optional[str] = EMAIL_TO) -> 'SubscriberRegistry':
+        """Carga los suscriptores del archivo JSON o, si no existe, de EMAIL_TO sin filtros"""
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            subscribers = [Subscriber.from_dict(item) for item in data]
+            logger.info(f"👥 {len(subscribers)} suscriptores cargados desde {path}")
+            return cls(subscribers)
+
+        emails = [addr.strip() for addr in (fallback_emails or '').split(',') if addr.strip()]
+        return cls([Subscriber(email) for email in emails])
+
+    def group_by_profile(self, epic_games: List[Dict], relevance_data: List[Dict],
+                         ggdeals_games: List[Dict], epic_games_changed: bool = True) -> List[Dict]:
+        """Agrupa a los suscriptores que recibirían exactamente el mismo correo.
+
+        Cada grupo es {'locale', 'epic_indices', 'deal_indices', 'emails'}; el coste de
+        renderizado depende del número de grupos, no del número de destinatarios.
+        Si los juegos de Epic no han cambiado no se vuelven a enviar, y los
+        suscriptores que se quedan sin contenido no forman grupo.
+        """
+        groups = OrderedDict()
+
+        for subscriber in self.subscribers:
+            epic_indices = tuple(
+                i for i, game in enumerate(epic_games)
+                if subscriber.wants_epic_game(game, relevance_data[i] if i < len(relevance_data) else {})
+            ) if epic_games_changed else ()
+            deal_indices = tuple(i for i, deal in enumerate(ggdeals_games) if subscriber.wants_deal(deal))
+
+            if not epic_indices and not deal_indices:
+                continue
+
+            profile = (subscriber.locale, epic_indices, deal_indices)
+            group = groups.get(profile)
+            if group is None:
+                group = {'locale': subscriber.locale, 'epic_indices': epic_indices,
+                         'deal_indices': deal_indices, 'emails': []}
+                groups[profile] = group
+            group['emails'].append(subscriber.email)
+
+        return list(groups.values())
@@ -0,0 +1,160 @@
+import heapq
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Normalización de títulos compartida por todas las fuentes (Epic, RAWG, Steam y
+# GG.deals): la clave canónica sirve para deduplicar, como clave de caché y para
+# unir registros de distintas fuentes; el índice de trigramas, para las
+# coincidencias aproximadas.
+
+TRADEMARK_PATTERN = re.compile("[™®©]")
+NON_WORD_PATTERN = re.compile(r"[^\w]+")
+# Calificativos de edición que no cambian el juego
+EDITION_WORDS = (r"(?:game of the year|goty|deluxe|definitive|complete|ultimate|gold|standard|enhanced|"
+                 r"anniversary|digital|premium|special|collectors|directors cut)")
+# Solo se quitan como sufijo final: "Título: GOTY Edition", "Título - Deluxe", "Título (Definitive
+# Edition)", "Título Deluxe Edition" o "Título GOTY". Nunca en medio ni al principio del título
+# ("Ultimate Chicken Horse", "Marvel Ultimate Alliance", "Gold Rush: The Game")
+EDITION_SUFFIX_PATTERNS = (
+    re.compile(rf"\s*[:\-–—(\[]?\s*(?:{EDITION_WORDS}\s+)+edition\s*[)\]]?\s*$"),
+    re.compile(rf"\s*[:\-–—(\[]\s*{EDITION_WORDS}(?:\s+{EDITION_WORDS})*\s*[)\]]?\s*$"),
+    re.compile(r"\s+(?:game of the year|goty|directors cut)\s*$"),
+)
+# Números romanos de secuela: solo tras otra palabra y al final o antes de un subtítulo
+# ("Hades II", "Diablo IV: ..."); nunca como primera palabra ("V Rising")
+ROMAN_NUMERALS = {'ii': '2', 'iii': '3', 'iv': '4', 'v': '5', 'vi': '6', 'vii': '7', 'viii': '8', 'ix': '9'}
+ROMAN_SEQUEL_PATTERN = re.compile(r"(\w\s+)(ii|iii|iv|v|vi|vii|viii|ix)(?=\s*(?:[:\-–—(\[]|$))")
+
+
+def _normalize(title: str) -> str:
+    """Minúsculas, sin acentos, marcas (™ ®) ni apóstrofos; conserva la puntuación"""
+    if not title.isascii():
+        # Las marcas se quitan antes de NFKD, que convertiría ™ en "TM"
+        title = unicodedata.normalize('NFKD', TRADEMARK_PATTERN.sub('', title))
+        title = ''.join(char for char in title if not unicodedata.combining(char))
+    return title.lower().replace("'", '').replace('’', '')
+
+
+def _fold_normalized(text: str) -> str:
+    return ' '.join(NON_WORD_PATTERN.sub(' ', text.replace('&', ' and ')).split())
+
+
+def fold(title: str) -> str:
+    """Minúsculas, sin acentos, marcas (™ ®) ni puntuación y con espacios simples"""
+    return _fold_normalized(_normalize(title))
+
+
+def strip_edition_suffix(title: str) -> str:
+    """Título normalizado sin el sufijo de edición final (si lo tiene)"""
+    text = _normalize(title)
+    for pattern in EDITION_SUFFIX_PATTERNS:
+        text = pattern.sub('', text)
+    return text
+
+
+def has_edition_suffix(title: str) -> bool:
+    """True si el título acaba en un sufijo de edición ('Deluxe Edition', '- GOTY'...)"""
+    return _fold_normalized(strip_edition_suffix(title)) != fold(title)
+
+
+@lru_cache(maxsize=65536)
+def canonical_title(title: str) -> str:
+    """Clave estable de un título: plegado, sin sufijo de edición y con la secuela en cifras.
+
+    'The Witcher® 3: Wild Hunt – GOTY Edition' y 'The Witcher 3 Wild Hunt' dan la
+    misma clave. Si al quitar el sufijo no queda nada se usa el título plegado.
+    """
+    text = strip_edition_suffix(title or '')
+    text = ROMAN_SEQUEL_PATTERN.sub(lambda match: match.group(1) + ROMAN_NUMERALS[match.group(2)], text)
+    return _fold_normalized(text) or fold(title or '')
+
+
+def trigrams(key: str) -> FrozenSet[str]:
+    """Trigramas de una clave canónica, con relleno para que cuenten los bordes de las palabras"""
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a: str, b: str) -> float:
+    """Similitud de Jaccard (0..1) entre los trigramas de las claves canónicas de dos títulos"""
+    grams_a = trigrams(canonical_title(a))
+    grams_b = trigrams(canonical_title(b))
+    if not grams_a or not grams_b:
+        return 0.0
+    shared = len(grams_a & grams_b)
+    return shared / (len(grams_a) + len(grams_b) - shared)
+
+
+class TrigramIndex:
+    """Índice invertido de trigramas para buscar títulos de forma aproximada.
+
+    Solo se comparan los registros que comparten algún trigrama con la consulta,
+    así que buscar entre miles de títulos cuesta lo mismo que recorrer unas
+    pocas listas de postings. Las coincidencias exactas de clave canónica se
+    resuelven con un diccionario.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._sizes: List[int] = []
+        self._values: List[Any] = []
+        self._exact: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, title: str, value: Any = None):
+        """Indexa un título; `value` es lo que devuelven las búsquedas (por defecto, el título)"""
+        key = canonical_title(title)
+        grams = trigrams(key)
+        item = len(self._values)
+        self._values.append(title if value is None else value)
+        self._sizes.append(len(grams))
+        self._exact.setdefault(key, item)
+        for gram in grams:
+            self._postings[gram].append(item)
+
+    def get(self, title: str) -> Optional[Any]:
+        """Registro con la misma clave canónica (el primero añadido), o None"""
+        item = self._exact.get(canonical_title(title))
+        return None if item is None else self._values[item]
+
+    def search(self, title: str, limit: int = 5, min_similarity: float = 0.3) -> List[Tuple[float, Any]]:
+        """Hasta `limit` registros (similitud, valor) de mayor a menor similitud"""
+        grams = trigrams(canonical_title(title))
+        if not grams:
+            return []
+
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for item in self._postings.get(gram, ()):
+                shared[item] += 1
+
+        size = len(grams)
+        scored = []
+        for item, count in shared.items():
+            score = count / (size + self._sizes[item] - count)
+            if score >= min_similarity:
+                # A igual similitud gana el registro añadido antes
+                scored.append((score, -item))
+        return [(score, self._values[-item]) for score, item in heapq.nlargest(limit, scored)]
+
+    def best(self, title: str, min_similarity: float = 0.3) -> Optional[Any]:
+        """Registro más parecido: la coincidencia canónica exacta o el de mayor similitud"""
+        exact = self.get(title)
+        if exact is not None:
+            return exact
+        results = self.search(title, limit=1, min_similarity=min_similarity)
+        return results[0][1] if results else None
+
+
+def best_match(title: str, records: Iterable[Any], key: Callable[[Any], str],
+               min_similarity: float = 0.3) -> Optional[Any]:
+    """Registro de `records` cuyo título (key(registro)) más se parece a `title`"""
+    index = TrigramIndex()
+    for record in records:
+        index.add(key(record) or '', record)
+    return index.best(title, min_similarity)